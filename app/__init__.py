@@ -7,7 +7,10 @@ from .main import bp as main_bp
 from .auth import bp as auth_bp
 from .admin import bp as admin_bp
 from .collector import bp as collector_bp
-from .models import User
+from .jobs import job_runner
+from .cache import identity_cache
+from . import sqlite_profile
+from .cli import register_cli
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -18,6 +21,8 @@ def create_app():
     migrate.init_app(app, db)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
+    job_runner.init_app(app)
+    register_cli(app)
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
     app.register_blueprint(admin_bp)
@@ -25,7 +30,7 @@ def create_app():
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        return identity_cache.user(int(user_id))
 
     @app.before_request
     def _force_login():
@@ -37,25 +42,8 @@ def create_app():
 
     @app.context_processor
     def inject_settings():
-        from .models import Setting
-        s = db.session.query(Setting).first()
-        return dict(app_setting=s)
+        return dict(app_setting=identity_cache.setting())
 
     with app.app_context():
-        from sqlalchemy import inspect
-        from .models import Role, User, Setting
-        insp = inspect(db.engine)
-        if insp.has_table('role') and not db.session.query(Role).count():
-            db.session.add_all([Role(name='admin'), Role(name='user')])
-            db.session.commit()
-        if insp.has_table('user') and not db.session.query(User).count():
-            admin_role = db.session.query(Role).filter_by(name='admin').first()
-            if admin_role:
-                u = User(username='admin', role=admin_role)
-                u.set_password('admin123')
-                db.session.add(u)
-                db.session.commit()
-        if insp.has_table('setting') and not db.session.query(Setting).count():
-            db.session.add(Setting(app_name='政企智能舆情分析报告生成'))
-            db.session.commit()
+        sqlite_profile.init_app(app, db)
     return app
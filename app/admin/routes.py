@@ -3,11 +3,14 @@ import json
 from flask_login import login_required, current_user
 from . import bp
 from ..extensions import db
-from ..models import User, Role, Setting, CollectionItem, CollectionDetail, CrawlRule, AIEngine, Crawler, CrawlerSource
-from ..collector.service import _headers_with_cookie
-from urllib.parse import urlparse
-from lxml import html
-import requests
+from ..models import User, Role, Setting, CollectionItem, CollectionDetail, CrawlRule, AIEngine, Crawler, CrawlerSource, Job
+from ..collector.registry import crawler_registry
+from ..collector.rule_index import rule_index, xpath_error, rule_xpath_errors
+from ..collector.purge import purge_items, purge_by_filter
+from ..bulk import parse_ids, delete_in
+from ..collector.search import index_items, search_items, match_query, highlight, available as search_available
+from ..jobs import job_runner, job_to_dict
+from ..cache import count_cache, identity_cache
 
 def is_admin():
     return current_user.is_authenticated and current_user.role and current_user.role.name == 'admin'
@@ -36,6 +39,7 @@ def users():
             u.set_password(password)
             db.session.add(u)
             db.session.commit()
+            identity_cache.invalidate()
         return redirect(url_for('admin.users'))
     users = db.session.query(User).all()
     return render_template('admin/users.html', users=users, roles=roles)
@@ -48,6 +52,7 @@ def roles():
         if name:
             db.session.add(Role(name=name))
             db.session.commit()
+            identity_cache.invalidate()
         return redirect(url_for('admin.roles'))
     roles = db.session.query(Role).all()
     return render_template('admin/roles.html', roles=roles)
@@ -66,6 +71,7 @@ def settings():
             s.app_name = app_name or s.app_name
             s.logo_path = logo_path or s.logo_path
         db.session.commit()
+        identity_cache.invalidate()
         return redirect(url_for('admin.settings'))
     return render_template('admin/settings.html', setting=s)
 
@@ -79,44 +85,29 @@ def collect_page():
 def collect_save():
     data = request.get_json(silent=True) or {}
     items = data.get('items') or []
-    saved = 0
-    for it in items:
-        url = it.get('url')
-        if not url:
-            continue
-        exists = db.session.query(CollectionItem).filter_by(url=url).first()
-        if exists:
-            exists.title = it.get('title') or exists.title
-            exists.cover = it.get('cover') or exists.cover
-            exists.source = it.get('source') or exists.source
-            exists.keyword = it.get('keyword') or exists.keyword
-        else:
-            obj = CollectionItem(
-                title=it.get('title') or '',
-                cover=it.get('cover'),
-                url=url,
-                source=it.get('source'),
-                keyword=it.get('keyword'),
-            )
-            db.session.add(obj)
-        saved += 1
-    db.session.commit()
-    return {'saved': saved}
+    from ..collector.ingest import save_items
+    return save_items(items)
 
 @bp.route('/collect/deep', methods=['POST'])
 @login_required
 def collect_deep():
-    url = request.json.get('url')
+    from ..collector.canonical import canonical_url
+    from ..collector.service import _default_headers
+    from ..collector.deep import save_detail
+    from ..collector import client
+    from ..config import Config
+    raw_url = request.json.get('url')
+    # an unresolved redirect link is fetched as-is, the client follows it
+    url = canonical_url(raw_url, timeout=Config.CANONICAL_RESOLVE_TIMEOUT) if raw_url else raw_url
     keyword = request.json.get('keyword')
-    item = db.session.query(CollectionItem).filter_by(url=url).first()
+    item = db.session.query(CollectionItem).filter(CollectionItem.url.in_([url, raw_url])).first()
     if item is None:
         item = CollectionItem(title=request.json.get('title') or '', cover=request.json.get('cover'), url=url, source=request.json.get('source'), keyword=keyword)
         db.session.add(item)
         db.session.commit()
-    import requests
     from bs4 import BeautifulSoup
     try:
-        r = requests.get(url, headers=_headers_with_cookie(), timeout=15)
+        r = client.get(url, headers=_default_headers(), timeout=15)
         final_url = r.url
         soup = BeautifulSoup(r.text, 'lxml')
         for tag in soup(['script','style','noscript']):
@@ -152,10 +143,11 @@ def collect_deep():
             txt = best.get_text('\n', strip=True)
         if txt:
             txt = txt[:20000]
-        det = CollectionDetail(item_id=item.id, content_text=txt, content_html=r.text, final_url=final_url)
-        db.session.add(det)
+        det = save_detail(item, txt, r.text, final_url)
         item.deep_status = True
+        index_items([item.id])
         db.session.commit()
+        count_cache.invalidate()
         preview = (txt or '')[:600]
         return jsonify({'status': 'ok', 'item_id': item.id, 'detail_id': det.id, 'preview': preview, 'final_url': final_url})
     except Exception as e:
@@ -171,36 +163,57 @@ def warehouse_page():
 def warehouse_list():
     page = int(request.args.get('page') or 1)
     size = int(request.args.get('size') or 10)
-    q = request.args.get('q') or ''
-    query = db.session.query(CollectionItem)
-    if q:
-        like = f"%{q}%"
-        query = query.filter((CollectionItem.title.ilike(like)) | (CollectionItem.source.ilike(like)))
-    total = query.count()
-    items = query.order_by(CollectionItem.created_at.desc()).offset((page-1)*size).limit(size).all()
-    
-    # Pre-fetch all enabled rules to avoid N+1
-    all_rules = db.session.query(CrawlRule).filter_by(enabled=True).all()
-    
+    q = (request.args.get('q') or '').strip()
+    cursor = request.args.get('cursor')
+    next_cursor = None
+    # queries with no indexable term (lone punctuation, quotes, operators)
+    # fall back to the substring filter
+    ranked = bool(q) and search_available() and match_query(q) is not None
+    if ranked:
+        # FTS5 over title/source/keyword/article text, best match first
+        total, ids = search_items(q, limit=size, offset=(page-1)*size)
+        found = {it.id: it for it in db.session.query(CollectionItem).filter(CollectionItem.id.in_(ids))} if ids else {}
+        items = [found[i] for i in ids if i in found]
+        has_more = page * size < total
+    else:
+        query = db.session.query(CollectionItem)
+        if q:
+            like = f"%{q}%"
+            query = query.filter((CollectionItem.title.ilike(like)) | (CollectionItem.source.ilike(like)))
+        total = count_cache.get_or_set(('warehouse', q), query.count)
+        if cursor is None:
+            items = query.order_by(CollectionItem.created_at.desc(), CollectionItem.id.desc()).offset((page-1)*size).limit(size).all()
+            has_more = page * size < total
+        else:
+            # keyset on (created_at, id): compare the stored text so rows that
+            # share a second are neither skipped nor repeated
+            created = db.type_coerce(CollectionItem.created_at, db.String)
+            if cursor:
+                c_at, _, c_id = cursor.rpartition('|')
+                if not c_at or not c_id.isdigit():
+                    return jsonify({'error': 'invalid cursor'}), 400
+                query = query.filter(db.tuple_(created, CollectionItem.id) < (c_at, int(c_id)))
+            rows = (query.add_columns(created)
+                    .order_by(CollectionItem.created_at.desc(), CollectionItem.id.desc()).limit(size + 1).all())
+            has_more = len(rows) > size
+            rows = rows[:size]
+            items = [r[0] for r in rows]
+            if has_more:
+                next_cursor = f'{rows[-1][1]}|{rows[-1][0].id}'
+
+    # item id -> item id of the canonical copy, for syndicated duplicates
+    dup_of = {}
+    if items:
+        Canon = db.aliased(CollectionDetail)
+        rows = (db.session.query(CollectionDetail.item_id, Canon.item_id)
+                .join(Canon, Canon.id == CollectionDetail.canonical_id)
+                .filter(CollectionDetail.item_id.in_([it.id for it in items])).all())
+        dup_of = dict(rows)
+
     data = []
     for it in items:
-        # Match rules logic
-        matched_rules = []
-        # 1. Match by source name
-        if it.source:
-            matched_rules.extend([r.name for r in all_rules if r.name == it.source])
-        
-        # 2. Match by site domain
-        try:
-            dom = urlparse(it.url).netloc
-            if dom:
-                matched_rules.extend([r.name or r.site for r in all_rules if r.site and r.site in dom])
-        except Exception:
-            pass
-            
-        # Deduplicate
-        matched_rules = list(set(matched_rules))
-        
+        matched_rules = list(dict.fromkeys(r.name or r.site for r in rule_index.match(it.source, it.url)))
+
         data.append({
             'id': it.id,
             'title': it.title,
@@ -210,9 +223,16 @@ def warehouse_list():
             'keyword': it.keyword,
             'deep_status': it.deep_status,
             'created_at': it.created_at.isoformat() if it.created_at else None,
-            'matched_rules': matched_rules
+            'matched_rules': matched_rules,
+            'duplicate_of': dup_of.get(it.id)
         })
-    return jsonify({'page': page, 'size': size, 'total': total, 'items': data})
+    if ranked and items:
+        texts = dict(db.session.query(CollectionDetail.item_id, CollectionDetail.content_text)
+                     .filter(CollectionDetail.item_id.in_([it.id for it in items])).order_by(CollectionDetail.id))
+        for row, it in zip(data, items):
+            row['title_html'] = highlight(it.title, q)
+            row['snippet'] = highlight(texts.get(it.id), q, 120)
+    return jsonify({'page': page, 'size': size, 'total': total, 'items': data, 'has_more': has_more, 'next_cursor': next_cursor})
 
 @bp.route('/warehouse/update', methods=['POST'])
 @login_required
@@ -235,7 +255,9 @@ def warehouse_update():
         it.keyword = keyword
     if deep_status is not None:
         it.deep_status = bool(deep_status)
+    index_items([it.id])
     db.session.commit()
+    count_cache.invalidate()
     return jsonify({'status': 'ok'})
 
 @bp.route('/warehouse/collect_dynamic', methods=['POST'])
@@ -254,22 +276,29 @@ def warehouse_collect_dynamic():
 @bp.route('/warehouse/delete', methods=['POST'])
 @login_required
 def warehouse_delete():
-    data = request.get_json(silent=True) or {}
-    ids = data.get('ids') or []
-    id_ = data.get('id')
-    if id_:
-        ids.append(id_)
-    ids = [int(i) for i in ids if i]
+    ids = parse_ids(request.get_json(silent=True) or {})
     if not ids:
         return jsonify({'error': 'missing ids'}), 400
-    deleted = 0
-    for i in ids:
-        it = db.session.get(CollectionItem, i)
-        if it:
-            db.session.delete(it)
-            deleted += 1
-    db.session.commit()
-    return jsonify({'status': 'ok', 'deleted': deleted})
+    res = purge_items(ids)
+    return jsonify({'status': 'ok', 'deleted': res['items'], 'details': res['details']})
+
+@bp.route('/warehouse/purge', methods=['POST'])
+@login_required
+def warehouse_purge():
+    data = request.get_json(silent=True) or {}
+    days = data.get('older_than_days')
+    deep = data.get('deep_status')
+    try:
+        res = purge_by_filter(
+            dry_run=bool(data.get('dry_run')),
+            keyword=(data.get('keyword') or '').strip() or None,
+            source=(data.get('source') or '').strip() or None,
+            older_than_days=float(days) if days not in (None, '') else None,
+            deep_status=None if deep in (None, '') else bool(int(deep)),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'status': 'ok', **res})
 
 @bp.route('/warehouse/analyze', methods=['POST'])
 @login_required
@@ -287,136 +316,72 @@ def warehouse_deep_collect():
     if id_:
         ids.append(id_)
     ids = [int(i) for i in ids if i]
+    from ..collector.deep import deep_collect_item
     results = []
-    
-    def find_rules(it):
-        rules = []
-        # 1. Match by source name (Highest Priority)
-        if it.source:
-            # Exact match by name
-            by_name = db.session.query(CrawlRule).filter(CrawlRule.name == it.source, CrawlRule.enabled == True).all()
-            rules.extend(by_name)
-            
-        # 2. Match by site domain
-        try:
-            dom = urlparse(it.url).netloc
-            if dom:
-                # Domain contains site or site contains domain (flexible match)
-                by_site = db.session.query(CrawlRule).filter(CrawlRule.enabled == True).filter(CrawlRule.site.ilike(f"%{dom}%")).all()
-                for r in by_site:
-                    if r not in rules:
-                        rules.append(r)
-                
-                # Also try partial domain match if no exact match
-                if not by_site:
-                    parts = dom.split('.')
-                    for j in range(len(parts)-2):
-                        base = '.'.join(parts[j:])
-                        sub_rules = db.session.query(CrawlRule).filter(CrawlRule.enabled == True).filter(CrawlRule.site.ilike(f"%{base}%")).all()
-                        for r in sub_rules:
-                            if r not in rules:
-                                rules.append(r)
-        except Exception:
-            pass
-            
-        return rules
-
-    import requests
     for i in ids:
         it = db.session.get(CollectionItem, i)
         if not it:
             continue
-        
-        # Find all applicable rules
-        rules = find_rules(it)
-        
-        # If no rules found, use a dummy None rule to trigger default extraction
-        if not rules:
-            rules = [None]
-            
-        success = False
-        for rule in rules:
-            headers = _headers_with_cookie()
-            if rule and rule.request_headers:
-                try:
-                    hdr = json.loads(rule.request_headers)
-                    if isinstance(hdr, dict):
-                        headers = hdr
-                except Exception:
-                    headers = headers
-            try:
-                r = requests.get(it.url, headers=headers, timeout=15)
-                final_url = r.url
-                doc = html.fromstring(r.text)
-                title_text = None
-                
-                if rule and rule.title_xpath:
-                    try:
-                        ns = doc.xpath(rule.title_xpath)
-                        if ns:
-                            title_text = ' '.join([n.text_content().strip() for n in ns]).strip()
-                    except Exception:
-                        title_text = None
-                
-                if not title_text:
-                    ns = doc.xpath('//h1')
-                    if ns:
-                        title_text = ' '.join([n.text_content().strip() for n in ns]).strip()
-                    
-                content_text = None
-                if rule and rule.content_xpath:
-                    try:
-                        ns = doc.xpath(rule.content_xpath)
-                        if ns:
-                            content_text = ' '.join([n.text_content().strip() for n in ns]).strip()
-                    except Exception:
-                        content_text = None
-                
-                if not content_text:
-                    ns = doc.xpath('//article')
-                    if ns:
-                        content_text = ' '.join([n.text_content().strip() for n in ns]).strip()
-                    if not content_text:
-                        ps = doc.xpath('//p')
-                        if ps:
-                            content_text = '\n'.join([p.text_content().strip() for p in ps if p.text_content().strip()])
-                
-                if content_text:
-                    content_text = content_text[:20000]
-                    
-                    det = db.session.query(CollectionDetail).filter_by(item_id=it.id).first()
-                    if det:
-                        det.content_text = content_text
-                        det.content_html = r.text
-                        det.final_url = final_url
-                    else:
-                        det = CollectionDetail(item_id=it.id, content_text=content_text, content_html=r.text, final_url=final_url)
-                        db.session.add(det)
-                        
-                    it.deep_status = True
-                    if title_text and title_text != it.title:
-                        it.title = title_text
-                        
-                    db.session.commit()
-                    results.append({'id': it.id, 'detail_id': det.id, 'rule_used': rule.name if rule else 'default'})
-                    success = True
-                    break # Stop if successful
-            except Exception:
-                continue
-        
-        if not success:
-            # Log failure or handle appropriately
-            pass
-            
+        try:
+            res = deep_collect_item(it)
+        except Exception:
+            res = None
+        if res:
+            results.append(res)
     return jsonify({'status': 'ok', 'count': len(results), 'items': results})
 
+@bp.route('/warehouse/deep_collect/submit', methods=['POST'])
+@login_required
+def warehouse_deep_collect_submit():
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    id_ = data.get('id')
+    if id_:
+        ids.append(id_)
+    ids = list(dict.fromkeys(int(i) for i in ids if i))
+    if not ids:
+        return jsonify({'error': 'missing ids'}), 400
+    job = job_runner.create('deep_collect', ids)
+    return jsonify({'status': 'ok', 'job_id': job.id, 'total': job.total})
+
+@bp.route('/jobs/<int:id>', methods=['GET'])
+@login_required
+def jobs_get(id):
+    job = db.session.get(Job, id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+    with_items = request.args.get('items') in ('1', 'true')
+    limit = int(request.args.get('limit') or 50)
+    return jsonify(job_to_dict(job, with_items=with_items, limit=limit))
+
+@bp.route('/jobs/<int:id>/cancel', methods=['POST'])
+@login_required
+def jobs_cancel(id):
+    job = db.session.get(Job, id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+    job_runner.cancel(id)
+    db.session.refresh(job)
+    return jsonify({'status': 'ok', 'job': job_to_dict(job)})
+
+@bp.route('/jobs/<int:id>/resume', methods=['POST'])
+@login_required
+def jobs_resume(id):
+    job = db.session.get(Job, id)
+    if not job:
+        return jsonify({'error': 'not found'}), 404
+    if not job_runner.resume(id):
+        return jsonify({'error': 'job has no unfinished items to resume', 'job': job_to_dict(job)}), 409
+    db.session.refresh(job)
+    return jsonify({'status': 'ok', 'job': job_to_dict(job)})
+
 @bp.route('/warehouse/detail/<int:id>', methods=['GET'])
 @login_required
 def warehouse_detail_preview(id):
     it = db.session.get(CollectionItem, id)
     if not it:
         return '数据不存在', 404
-    det = db.session.query(CollectionDetail).filter_by(item_id=id).first()
+    det = db.session.query(CollectionDetail).filter_by(item_id=id).order_by(CollectionDetail.id.desc()).first()
     if not det:
         return '暂无详细内容，请先执行采集', 404
     return render_template('admin/preview.html', item=it, detail=det)
@@ -461,6 +426,7 @@ def rules_list():
             'content_xpath': r.content_xpath,
             'request_headers': r.request_headers,
             'enabled': r.enabled,
+            'xpath_errors': rule_xpath_errors(r),
         })
     return jsonify({'page': page, 'size': size, 'total': total, 'items': data})
 
@@ -476,6 +442,8 @@ def ai_engines_list():
         query = query.filter((AIEngine.provider.ilike(like)) | (AIEngine.model_name.ilike(like)))
     total = query.count()
     rows = query.order_by(AIEngine.created_at.desc()).offset((page-1)*size).limit(size).all()
+    from ..ai.pool import engine_pool
+    pool = engine_pool.snapshot()
     data = []
     for r in rows:
         mask = None
@@ -491,9 +459,36 @@ def ai_engines_list():
             'api_key_mask': mask,
             'model_name': r.model_name,
             'enabled': r.enabled,
+            'context_tokens': r.context_tokens,
+            'output_reserve': r.output_reserve,
+            'tags': r.tags,
+            'max_concurrency': r.max_concurrency,
+            'pool': pool.get(r.id),
         })
     return jsonify({'page': page, 'size': size, 'total': total, 'items': data})
 
+@bp.route('/ai_engines/pool', methods=['GET'])
+@login_required
+def ai_engines_pool():
+    # routing state of this worker process
+    from ..ai.pool import engine_pool
+    return jsonify({'engines': engine_pool.snapshot()})
+
+_ENGINE_LIMITS = ('context_tokens', 'output_reserve', 'max_concurrency')
+
+def _limit_field(name, value):
+    # blank means "use the AI_CONTEXT_TOKENS / AI_OUTPUT_RESERVE / AI_ENGINE_CONCURRENCY default"
+    if value is None or str(value).strip() == '':
+        return None
+    n = int(value)
+    if n <= 0:
+        raise ValueError(f'{name} must be positive')
+    return n
+
+def _tags_field(value):
+    from ..ai.pool import parse_tags
+    return ','.join(sorted(parse_tags(str(value or '')))) or None
+
 @bp.route('/ai_engines/create', methods=['POST'])
 @login_required
 def ai_engines_create():
@@ -505,7 +500,12 @@ def ai_engines_create():
         return jsonify({'error': 'missing fields'}), 400
     api_key = (data.get('api_key') or '').strip() or None
     enabled = bool(data.get('enabled', True))
-    r = AIEngine(provider=provider, api_url=api_url, api_key=api_key, model_name=model_name, enabled=enabled)
+    try:
+        limits = {k: _limit_field(k, data.get(k)) for k in _ENGINE_LIMITS}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    r = AIEngine(provider=provider, api_url=api_url, api_key=api_key, model_name=model_name, enabled=enabled,
+                 tags=_tags_field(data.get('tags')), **limits)
     db.session.add(r)
     db.session.commit()
     return jsonify({'status': 'ok', 'id': r.id})
@@ -537,87 +537,90 @@ def ai_engines_update():
     enabled = data.get('enabled')
     if enabled is not None:
         r.enabled = bool(enabled)
+    for k in _ENGINE_LIMITS:
+        if k in data:
+            try:
+                setattr(r, k, _limit_field(k, data.get(k)))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+    if 'tags' in data:
+        r.tags = _tags_field(data.get('tags'))
+    from ..ai.cache import response_cache
+    # a new endpoint or key may answer differently
+    response_cache.invalidate_engine([r.id])
     db.session.commit()
     return jsonify({'status': 'ok'})
 
 @bp.route('/ai_engines/delete', methods=['POST'])
 @login_required
 def ai_engines_delete():
-    data = request.get_json(silent=True) or {}
-    ids = data.get('ids') or []
-    id_ = data.get('id')
-    if id_:
-        ids.append(id_)
-    ids = [int(i) for i in ids if i]
+    from ..ai.cache import response_cache
+    ids = parse_ids(request.get_json(silent=True) or {})
     if not ids:
         return jsonify({'error': 'missing ids'}), 400
-    deleted = 0
-    for i in ids:
-        r = db.session.get(AIEngine, i)
-        if r:
-            db.session.delete(r)
-            deleted += 1
+    deleted = delete_in(AIEngine.id, ids)
+    response_cache.invalidate_engine(ids)
     db.session.commit()
     return jsonify({'status': 'ok', 'deleted': deleted})
 
-def _is_azure_engine(engine: AIEngine) -> bool:
-    host = (engine.api_url or '').lower()
-    prov = (engine.provider or '').lower()
-    return ('.azure.com' in host) or ('azure' in prov)
-
-def _call_ai_engine(engine: AIEngine, messages: list):
-    headers = {'Content-Type': 'application/json'}
-    payload = {'messages': messages}
-    if _is_azure_engine(engine):
-        if engine.api_key:
-            headers['api-key'] = engine.api_key
-        # Azure 路径携带 deployment，payload通常无需 model 字段
-    else:
-        if engine.api_key:
-            headers['Authorization'] = f'Bearer {engine.api_key}'
-        payload['model'] = engine.model_name
-    try:
-        resp = requests.post(engine.api_url, json=payload, headers=headers, timeout=30)
-        status = resp.status_code
-        data = None
-        try:
-            data = resp.json()
-        except Exception:
-            data = None
-        if status >= 400:
-            msg = None
-            if isinstance(data, dict):
-                err = data.get('error')
-                if isinstance(err, dict):
-                    msg = err.get('message') or err.get('code') or str(err)
-                elif isinstance(err, str):
-                    msg = err
-            return {'status': 'error', 'message': msg or f'HTTP {status}'}
-        txt = None
-        if isinstance(data, dict):
-            choices = data.get('choices')
-            if isinstance(choices, list) and choices:
-                msg = choices[0].get('message') or {}
-                txt = msg.get('content')
-            elif isinstance(data.get('message'), dict):
-                txt = data.get('message', {}).get('content')
-        return {'status': 'ok', 'text': txt or '', 'raw': data}
-    except Exception as e:
-        return {'status': 'error', 'message': str(e)}
+@bp.route('/ai_cache/stats', methods=['GET'])
+@login_required
+def ai_cache_stats():
+    from ..ai.cache import response_cache
+    return jsonify(response_cache.snapshot())
 
-@bp.route('/ai_engines/chat/send', methods=['POST'])
+@bp.route('/ai_cache/clear', methods=['POST'])
 @login_required
-def ai_engines_chat_send():
-    data = request.get_json(silent=True) or {}
+def ai_cache_clear():
+    from ..ai.cache import response_cache
+    deleted = response_cache.clear()
+    db.session.commit()
+    return jsonify({'status': 'ok', 'deleted': deleted})
+
+def _sse_response(events):
+    from flask import Response, stream_with_context
+    from ..ai.engine import sse
+    # end the read transaction now instead of holding it for the whole completion
+    db.session.close()
+    def generate():
+        # werkzeug closes this generator when the browser goes away, which
+        # closes the upstream completion through engine.stream's finally
+        for ev in events:
+            yield sse(ev)
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def _chat_engine(data):
     id_ = data.get('id')
-    messages = data.get('messages') or []
     if not id_:
-        return jsonify({'error': 'missing id'}), 400
+        return None, (jsonify({'error': 'missing id'}), 400)
     r = db.session.get(AIEngine, int(id_))
     if not r or not r.enabled:
-        return jsonify({'error': 'engine not available'}), 400
-    result = _call_ai_engine(r, messages)
-    return jsonify(result)
+        return None, (jsonify({'error': 'engine not available'}), 400)
+    return r, None
+
+def _chat_messages(engine, data):
+    from ..ai.packer import engine_budget, fit_messages
+    return fit_messages(data.get('messages') or [], engine_budget(engine))
+
+@bp.route('/ai_engines/chat/send', methods=['POST'])
+@login_required
+def ai_engines_chat_send():
+    from ..ai.pool import engine_pool, with_fallbacks
+    data = request.get_json(silent=True) or {}
+    r, err = _chat_engine(data)
+    if err:
+        return err
+    return jsonify(engine_pool.call(with_fallbacks(r), _chat_messages(r, data), bool(data.get('no_cache')), prefer=r))
+
+@bp.route('/ai_engines/chat/stream', methods=['POST'])
+@login_required
+def ai_engines_chat_stream():
+    from ..ai.pool import engine_pool, with_fallbacks
+    data = request.get_json(silent=True) or {}
+    r, err = _chat_engine(data)
+    if err:
+        return err
+    return _sse_response(engine_pool.stream(with_fallbacks(r), _chat_messages(r, data), bool(data.get('no_cache')), prefer=r))
 
 @bp.route('/crawlers', methods=['GET'])
 @login_required
@@ -676,6 +679,7 @@ def crawlers_create():
     r = Crawler(name=name, code=code, key=key, class_path=class_path, base_url=base_url, headers_json=headers_json, params_json=params_json, dynamic_keys=dynamic_keys, entry=entry, config_json=config_json, enabled=enabled)
     db.session.add(r)
     db.session.commit()
+    crawler_registry.invalidate()
     return jsonify({'status': 'ok', 'id': r.id})
 
 @bp.route('/crawlers/update', methods=['POST'])
@@ -722,26 +726,19 @@ def crawlers_update():
     if enabled is not None:
         r.enabled = bool(enabled)
     db.session.commit()
+    crawler_registry.invalidate()
     return jsonify({'status': 'ok'})
 
 @bp.route('/crawlers/delete', methods=['POST'])
 @login_required
 def crawlers_delete():
-    data = request.get_json(silent=True) or {}
-    ids = data.get('ids') or []
-    id_ = data.get('id')
-    if id_:
-        ids.append(id_)
-    ids = [int(i) for i in ids if i]
+    ids = parse_ids(request.get_json(silent=True) or {})
     if not ids:
         return jsonify({'error': 'missing ids'}), 400
-    deleted = 0
-    for i in ids:
-        r = db.session.get(Crawler, i)
-        if r:
-            db.session.delete(r)
-            deleted += 1
+    delete_in(CrawlerSource.crawler_id, ids)
+    deleted = delete_in(Crawler.id, ids)
     db.session.commit()
+    crawler_registry.invalidate()
     return jsonify({'status': 'ok', 'deleted': deleted})
 
 @bp.route('/crawlers/sources/list', methods=['GET'])
@@ -765,26 +762,18 @@ def crawler_sources_add():
     s = CrawlerSource(source=source, crawler_id=r.id, enabled=True)
     db.session.add(s)
     db.session.commit()
+    crawler_registry.invalidate()
     return jsonify({'status': 'ok', 'id': s.id})
 
 @bp.route('/crawlers/sources/delete', methods=['POST'])
 @login_required
 def crawler_sources_delete():
-    data = request.get_json(silent=True) or {}
-    ids = data.get('ids') or []
-    id_ = data.get('id')
-    if id_:
-        ids.append(id_)
-    ids = [int(i) for i in ids if i]
+    ids = parse_ids(request.get_json(silent=True) or {})
     if not ids:
         return jsonify({'error': 'missing ids'}), 400
-    deleted = 0
-    for i in ids:
-        s = db.session.get(CrawlerSource, i)
-        if s:
-            db.session.delete(s)
-            deleted += 1
+    deleted = delete_in(CrawlerSource.id, ids)
     db.session.commit()
+    crawler_registry.invalidate()
     return jsonify({'status': 'ok', 'deleted': deleted})
 
 @bp.route('/crawlers/run', methods=['POST'])
@@ -794,31 +783,14 @@ def crawlers_run():
     id_ = data.get('id')
     code = (data.get('code') or '').strip()
     params = data.get('params') or {}
-    from ..collector.service import run_crawler_by_entry, run_crawler_by_code, run_crawler_by_class
+    from ..collector.service import run_crawler_by_code
     items = []
     try:
         if id_:
-            r = db.session.get(Crawler, int(id_))
-            if not r or not r.enabled:
+            c = crawler_registry.get_by_id(int(id_))
+            if not c or not c.enabled:
                 return jsonify({'error': 'crawler not available'}), 400
-            if r.class_path:
-                import json as _json
-                hdr = None
-                prm = None
-                try:
-                    hdr = _json.loads(r.headers_json) if r.headers_json else None
-                except Exception:
-                    hdr = None
-                try:
-                    prm = _json.loads(r.params_json) if r.params_json else None
-                except Exception:
-                    prm = None
-                merged = prm or {}
-                if isinstance(params, dict):
-                    merged.update(params)
-                items = run_crawler_by_class(r.class_path, r.base_url, hdr, merged)
-            else:
-                items = run_crawler_by_entry(r.entry, params)
+            items = c.run(params)
         elif code:
             items = run_crawler_by_code(code, params)
         else:
@@ -857,6 +829,7 @@ def crawlers_headers_refresh():
         import json as _json
         r.headers_json = _json.dumps(hdr or {})
         db.session.commit()
+        crawler_registry.invalidate()
         return jsonify({'status': 'ok'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -921,6 +894,7 @@ def crawlers_analyze():
             m = CrawlerSource(source=source_name, crawler_id=cid, enabled=True)
             db.session.add(m)
             db.session.commit()
+        crawler_registry.invalidate()
         return jsonify({'status': 'ok', 'id': cid, 'code': code})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -928,42 +902,82 @@ def crawlers_analyze():
 @bp.route('/ai_clean', methods=['GET'])
 @login_required
 def ai_clean_page():
+    from ..ai.pool import engine_tags
     engines = db.session.query(AIEngine).filter_by(enabled=True).order_by(AIEngine.created_at.desc()).all()
-    return render_template('admin/ai_clean.html', engines=engines)
+    tags = sorted(set().union(*[engine_tags(e) for e in engines]))
+    return render_template('admin/ai_clean.html', engines=engines, tags=tags)
 
-@bp.route('/ai_clean/run', methods=['POST'])
-@login_required
-def ai_clean_run():
-    data = request.get_json(silent=True) or {}
+def _clean_engines(data):
+    # engine_id "auto" routes through the engine pool, optionally limited to
+    # `tag`; a chosen engine comes first and falls back to engines sharing a tag
+    from ..ai.pool import candidates, with_fallbacks
     engine_id = data.get('engine_id')
-    limit = int(data.get('limit') or 10)
-    task = (data.get('task') or 'analyze').strip()
     if not engine_id:
-        return jsonify({'error': 'missing engine_id'}), 400
+        return None, (jsonify({'error': 'missing engine_id'}), 400)
+    if str(engine_id) == 'auto':
+        rows = candidates((data.get('tag') or '').strip() or None)
+        if not rows:
+            return None, (jsonify({'error': 'engine not available'}), 404)
+        return rows, None
     eng = db.session.get(AIEngine, int(engine_id))
     if not eng or not eng.enabled:
-        return jsonify({'error': 'engine not available'}), 404
-    from sqlalchemy import text as _text
+        return None, (jsonify({'error': 'engine not available'}), 404)
+    return with_fallbacks(eng), None
+
+def _clean_prefer(data, engines):
+    return None if str(data.get('engine_id')) == 'auto' else engines[0]
+
+def _clean_request(data):
+    from ..ai.clean import recent_articles, build_messages
+    limit = int(data.get('limit') or 10)
+    task = (data.get('task') or 'analyze').strip()
+    engines, err = _clean_engines(data)
+    if err:
+        return None, None, err
     rows = []
     err = None
     try:
-        sql = _text('SELECT id, title, content, created_at FROM article_details ORDER BY created_at DESC LIMIT :lim')
-        rs = db.session.execute(sql, {'lim': limit})
-        for r in rs:
-            rows.append({'id': r[0], 'title': r[1], 'content': (r[2] or '')[:1000], 'created_at': str(r[3])})
+        rows = recent_articles(engines, task, limit)
     except Exception as e:
         err = str(e)
-    messages = []
-    sys = '你是一个数据清洗与分析助手，基于提供的文章列表，执行清洗与统计任务。'
-    if task == 'clean':
-        usr = '请针对以下文章列表执行清洗：移除冗余空格、去除明显的乱码段、标记可能的重复标题，并给出清洗建议。用简体中文输出，列出问题与建议，每条尽量简洁。'
-    else:
-        usr = '请对以下文章列表进行分析：统计标题重复情况、内容长度分布、可能的采集异常，并给出改进建议。用简体中文输出。'
-    payload = {'rows': rows, 'error': err}
-    messages.append({'role': 'system', 'content': sys})
-    messages.append({'role': 'user', 'content': f'{usr}\n数据: ' + json.dumps(payload, ensure_ascii=False)})
-    result = _call_ai_engine(eng, messages)
-    return jsonify(result)
+    return engines, build_messages(task, rows, err), None
+
+@bp.route('/ai_clean/run', methods=['POST'])
+@login_required
+def ai_clean_run():
+    from ..ai.pool import engine_pool
+    data = request.get_json(silent=True) or {}
+    engines, messages, err = _clean_request(data)
+    if err:
+        return err
+    return jsonify(engine_pool.call(engines, messages, bool(data.get('no_cache')), prefer=_clean_prefer(data, engines)))
+
+@bp.route('/ai_clean/stream', methods=['POST'])
+@login_required
+def ai_clean_stream():
+    from ..ai.pool import engine_pool
+    data = request.get_json(silent=True) or {}
+    engines, messages, err = _clean_request(data)
+    if err:
+        return err
+    return _sse_response(engine_pool.stream(engines, messages, bool(data.get('no_cache')), prefer=_clean_prefer(data, engines)))
+
+@bp.route('/ai_clean/jobs', methods=['POST'])
+@login_required
+def ai_clean_job():
+    from ..ai.clean import start_job
+    data = request.get_json(silent=True) or {}
+    engines, err = _clean_engines(data)
+    if err:
+        return err
+    job = start_job(engines, (data.get('task') or 'analyze').strip(),
+                    keyword=(data.get('keyword') or '').strip() or None,
+                    source=(data.get('source') or '').strip() or None,
+                    concurrency=data.get('concurrency'),
+                    tag=(data.get('tag') or '').strip() or None,
+                    auto=str(data.get('engine_id')) == 'auto')
+    params = json.loads(job.params)
+    return jsonify({'status': 'ok', 'job_id': job.id, 'total': job.total, 'articles': params['articles']})
 
 @bp.route('/rules/create', methods=['POST'])
 @login_required
@@ -972,6 +986,10 @@ def rules_create():
     site = data.get('site')
     if not site:
         return jsonify({'error': 'missing site'}), 400
+    for field in ('title_xpath', 'content_xpath'):
+        err = xpath_error(data.get(field))
+        if err:
+            return jsonify({'error': f'invalid {field}: {err}'}), 400
     headers_raw = data.get('request_headers')
     def _normalize_headers(h):
         if not h:
@@ -1005,6 +1023,7 @@ def rules_create():
     r = CrawlRule(name=data.get('name'), site=site, title_xpath=data.get('title_xpath'), content_xpath=data.get('content_xpath'), request_headers=headers, enabled=bool(data.get('enabled', True)))
     db.session.add(r)
     db.session.commit()
+    rule_index.invalidate()
     return jsonify({'status': 'ok', 'id': r.id})
 
 @bp.route('/rules/copy', methods=['POST'])
@@ -1029,6 +1048,7 @@ def rules_copy():
     )
     db.session.add(new_rule)
     db.session.commit()
+    rule_index.invalidate()
     return jsonify({'status': 'ok', 'id': new_rule.id})
 
 @bp.route('/rules/update', methods=['POST'])
@@ -1041,6 +1061,10 @@ def rules_update():
     r = db.session.get(CrawlRule, int(id_))
     if not r:
         return jsonify({'error': 'not found'}), 404
+    for field in ('title_xpath', 'content_xpath'):
+        err = xpath_error(data.get(field))
+        if err:
+            return jsonify({'error': f'invalid {field}: {err}'}), 400
     name = data.get('name')
     if name is not None:
         r.name = name
@@ -1085,24 +1109,16 @@ def rules_update():
     if enabled is not None:
         r.enabled = bool(enabled)
     db.session.commit()
+    rule_index.invalidate()
     return jsonify({'status': 'ok'})
 
 @bp.route('/rules/delete', methods=['POST'])
 @login_required
 def rules_delete():
-    data = request.get_json(silent=True) or {}
-    ids = data.get('ids') or []
-    id_ = data.get('id')
-    if id_:
-        ids.append(id_)
-    ids = [int(i) for i in ids if i]
+    ids = parse_ids(request.get_json(silent=True) or {})
     if not ids:
         return jsonify({'error': 'missing ids'}), 400
-    deleted = 0
-    for i in ids:
-        r = db.session.get(CrawlRule, i)
-        if r:
-            db.session.delete(r)
-            deleted += 1
+    deleted = delete_in(CrawlRule.id, ids)
     db.session.commit()
+    rule_index.invalidate()
     return jsonify({'status': 'ok', 'deleted': deleted})
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..extensions import db
+from ..models import AIResponseCache
+from ..config import Config
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def cache_key(engine, payload: dict) -> str:
+    # payload is the request body minus transport flags, so sampling params
+    # and the model take part in the key along with the messages
+    body = {k: v for k, v in payload.items() if k != 'stream'}
+    body['engine_id'] = engine.id
+    body['model_name'] = engine.model_name
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+# Two tiers: a per-process LRU in front of the ai_response_cache table,
+# which is shared by all workers and survives restarts. Both honour the TTL.
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float, persist: bool):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persist = persist
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'bypassed': 0, 'stores': 0}
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, engine_id, value, ttl):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._lru[key] = (time.monotonic() + ttl, engine_id, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.maxsize:
+                self._lru.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                if hit[0] > time.monotonic():
+                    self._lru.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return hit[2]
+                del self._lru[key]
+        if self.persist:
+            now = _utcnow()
+            # own short-lived connection: lookups happen right before a long
+            # stream and must not leave a read transaction open on the session
+            with db.engine.connect() as conn:
+                row = conn.execute(db.select(AIResponseCache.engine_id, AIResponseCache.response, AIResponseCache.expires_at)
+                                   .where(AIResponseCache.key == key, AIResponseCache.expires_at > now)).first()
+            if row is not None:
+                value = json.loads(row.response)
+                self._remember(key, row.engine_id, value, (row.expires_at - now).total_seconds())
+                self.count('db_hits')
+                return value
+        self.count('misses')
+        return None
+
+    def put(self, key: str, engine, value: dict):
+        self._remember(key, engine.id, value, self.ttl)
+        self.count('stores')
+        if not self.persist:
+            return
+        now = _utcnow()
+        row = {'key': key, 'engine_id': engine.id, 'model_name': engine.model_name,
+               'response': json.dumps(value, ensure_ascii=False),
+               'created_at': now, 'expires_at': now + timedelta(seconds=self.ttl)}
+        with db.engine.begin() as conn:
+            if db.engine.dialect.name == 'sqlite':
+                stmt = sqlite_insert(AIResponseCache).values(row)
+                conn.execute(stmt.on_conflict_do_update(index_elements=['key'], set_={
+                    k: stmt.excluded[k] for k in ('response', 'created_at', 'expires_at')}))
+            else:
+                conn.execute(db.delete(AIResponseCache).where(AIResponseCache.key == key))
+                conn.execute(db.insert(AIResponseCache).values(row))
+
+    def invalidate_engine(self, engine_ids):
+        # this process only; other workers drop their copies when the TTL runs out
+        ids = {int(i) for i in engine_ids}
+        with self._lock:
+            for k in [k for k, v in self._lru.items() if v[1] in ids]:
+                del self._lru[k]
+        return db.session.query(AIResponseCache).filter(AIResponseCache.engine_id.in_(ids)).delete(synchronize_session=False)
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+        return db.session.query(AIResponseCache).delete(synchronize_session=False)
+
+    def prune_expired(self):
+        return db.session.query(AIResponseCache).filter(AIResponseCache.expires_at <= _utcnow()).delete(synchronize_session=False)
+
+    def snapshot(self):
+        with self._lock:
+            out = dict(self.stats, memory_entries=len(self._lru), memory_max=self.maxsize)
+        hits = out['memory_hits'] + out['db_hits']
+        out['hit_rate'] = round(hits / (hits + out['misses']), 4) if hits + out['misses'] else None
+        out['db_entries'] = db.session.query(AIResponseCache).filter(AIResponseCache.expires_at > _utcnow()).count() if self.persist else None
+        out['ttl'] = self.ttl
+        return out
+
+response_cache = ResponseCache(Config.AI_CACHE_SIZE, Config.AI_CACHE_TTL, Config.AI_CACHE_PERSIST)
@@ -0,0 +1,172 @@
+import json
+from ..extensions import db
+from ..models import AIEngine, CollectionDetail, CollectionItem, JobItem
+from ..config import Config
+from ..jobs import register
+from . import packer
+
+SYSTEM = '你是一个数据清洗与分析助手，基于提供的文章列表，执行清洗与统计任务。'
+TASKS = {
+    'clean': '请针对以下文章列表执行清洗：移除冗余空格、去除明显的乱码段、标记可能的重复标题，并给出清洗建议。用简体中文输出，列出问题与建议，每条尽量简洁。',
+    'analyze': '请对以下文章列表进行分析：统计标题重复情况、内容长度分布、可能的采集异常，并给出改进建议。用简体中文输出。',
+}
+REDUCE = ('以下是对同一批数据分段{task}得到的 {n} 份结论（覆盖 {articles} 篇文章）。'
+          '请合并为一份整体结论：合并相同问题并累计出现次数，保留具体例子，去掉重复表述，按重要程度排序。用简体中文输出。')
+
+def task_prompt(task: str) -> str:
+    return TASKS.get(task) or TASKS['analyze']
+
+def article_query(*columns, keyword=None, source=None):
+    # canonical articles only: near-duplicate copies (canonical_id set) would
+    # just repeat findings and cost tokens
+    q = (db.session.query(*columns)
+         .join(CollectionItem, CollectionItem.id == CollectionDetail.item_id)
+         .filter(CollectionDetail.canonical_id.is_(None)))
+    if keyword:
+        q = q.filter(CollectionItem.keyword == keyword)
+    if source:
+        q = q.filter(CollectionItem.source == source)
+    return q
+
+_ARTICLE_COLUMNS = (CollectionDetail.id, CollectionItem.title, CollectionItem.source, CollectionItem.created_at, CollectionDetail.content_text)
+
+def _article(row, cap: int):
+    return {'id': row[0], 'title': row[1], 'source': row[2], 'created_at': str(row[3]), 'content': packer.clip(row[4], cap)}
+
+def build_messages(task: str, articles: list, error: str | None = None):
+    payload = {'rows': articles, 'error': error}
+    return [
+        {'role': 'system', 'content': SYSTEM},
+        {'role': 'user', 'content': f'{task_prompt(task)}\n数据: ' + json.dumps(payload, ensure_ascii=False)},
+    ]
+
+def batch_budget(engines, task: str):
+    # (tokens left for the article list, per-article cap) for one map call;
+    # with several engines the smallest context wins so any of them can serve
+    budget = min(packer.engine_budget(e) for e in engines) - packer.messages_tokens(build_messages(task, []))
+    return budget, max(64, min(Config.AI_ARTICLE_TOKENS, budget // 2))
+
+def recent_articles(engines, task: str, limit: int):
+    # newest articles first, as many of them as fit one prompt
+    budget, cap = batch_budget(engines, task)
+    rows = article_query(*_ARTICLE_COLUMNS).order_by(CollectionDetail.created_at.desc(), CollectionDetail.id.desc()).limit(limit)
+    return next(packer.pack((_article(r, cap) for r in rows), budget), [])
+
+# JSON keys, id and timestamp of one article in the prompt
+_ITEM_OVERHEAD = packer.item_tokens({'id': 10 ** 9, 'title': '', 'source': '', 'created_at': '0000-00-00 00:00:00.000000', 'content': ''})
+
+def plan_batches(engines, task: str, keyword=None, source=None):
+    # Streams (id, sizes) in id order from SQL length() columns and packs the
+    # articles into prompts that fill the engine's context. No estimate counts
+    # more than one token per character and clip() keeps content within cap,
+    # so this bound never undercounts what the map step sends. Batches are id
+    # ranges, so a job item only stores its first id and the plan survives
+    # restarts unchanged.
+    budget, cap = batch_budget(engines, task)
+    q = article_query(CollectionDetail.id,
+                      db.func.coalesce(db.func.length(CollectionItem.title), 0)
+                      + db.func.coalesce(db.func.length(CollectionItem.source), 0),
+                      db.func.coalesce(db.func.length(CollectionDetail.content_text), 0),
+                      keyword=keyword, source=source).order_by(CollectionDetail.id)
+    starts = []
+    used = 0
+    count = 0
+    last = None
+    for id_, meta, clen in q.yield_per(2000):
+        cost = meta + min(clen, cap) + _ITEM_OVERHEAD
+        if not starts or used + cost > budget:
+            starts.append(id_)
+            used = 0
+        used += cost
+        count += 1
+        last = id_
+    return starts, last, count, budget, cap
+
+def start_job(engines, task: str = 'analyze', keyword=None, source=None, concurrency=None, tag=None, auto=False):
+    # auto: batches go through the engine pool (enabled engines, optionally
+    # only those tagged `tag`) instead of the single engine in `engines`
+    from ..jobs import job_runner
+    starts, last, count, budget, cap = plan_batches(engines, task, keyword, source)
+    if not concurrency:
+        concurrency = sum(e.max_concurrency or Config.AI_ENGINE_CONCURRENCY for e in engines) if auto else Config.AI_CLEAN_CONCURRENCY
+    params = {'engine_id': None if auto else engines[0].id, 'auto': auto, 'tag': tag,
+              'task': task, 'keyword': keyword, 'source': source,
+              'max_id': last, 'articles': count,
+              'concurrency': max(1, min(int(concurrency), Config.JOB_WORKERS)),
+              'budget': budget, 'cap': cap}
+    return job_runner.create('ai_clean', starts, params)
+
+def _params(job):
+    return json.loads(job.params or '{}')
+
+def _engines(params):
+    from .pool import candidates, with_fallbacks
+    if params.get('auto'):
+        # re-read on every call so engines enabled or disabled mid-run are
+        # honoured; only those whose context holds a planned batch qualify
+        rows = [e for e in candidates(params.get('tag')) if batch_budget([e], params.get('task'))[0] >= params['budget']]
+        if not rows:
+            raise ValueError('no AI engine available')
+        return rows
+    eng = db.session.get(AIEngine, int(params['engine_id']))
+    if not eng or not eng.enabled:
+        raise ValueError('engine not available')
+    return with_fallbacks(eng)
+
+def _call(engines, messages, params):
+    from .pool import engine_pool
+    res = engine_pool.call(engines, messages, prefer=None if params.get('auto') else engines[0])
+    if res.get('status') != 'ok':
+        raise RuntimeError(res.get('message') or 'AI call failed')
+    return res
+
+def _reduce(job):
+    # Merges the per-batch findings. When they do not fit one prompt they are
+    # merged in groups and the merged texts merged again until one is left.
+    params = _params(job)
+    rows = (db.session.query(JobItem.result).filter(JobItem.job_id == job.id, JobItem.status == 'ok')
+            .order_by(JobItem.ref_id).all())
+    parts = [json.loads(r[0]) for r in rows if r[0]]
+    texts = [p['text'] for p in parts if p.get('text')]
+    covered = sum(p.get('articles') or 0 for p in parts)
+    summary = {'articles': params.get('articles'), 'covered': covered, 'batches': job.total,
+               'failed_batches': job.failed, 'rounds': 0}
+    if not texts:
+        return dict(summary, text='')
+    engines = _engines(params)
+    task = '清洗' if params.get('task') == 'clean' else '分析'
+    budget = min(packer.engine_budget(e) for e in engines) - packer.estimate_tokens(SYSTEM + REDUCE) - 2 * packer.MESSAGE_TOKENS
+    while len(texts) > 1:
+        groups = list(packer.pack(texts, budget, cost=lambda t: packer.estimate_tokens(t) + 8))
+        if len(groups) == len(texts):
+            # nothing fits together any more; pair up and let the model squeeze
+            groups = [texts[i:i + 2] for i in range(0, len(texts), 2)]
+        merged = []
+        for g in groups:
+            if len(g) == 1:
+                merged.append(g[0])
+                continue
+            body = '\n\n'.join(f'【第 {i + 1} 份】\n{t}' for i, t in enumerate(g))
+            messages = [{'role': 'system', 'content': SYSTEM},
+                        {'role': 'user', 'content': REDUCE.format(task=task, n=len(g), articles=covered) + '\n\n' + body}]
+            merged.append(_call(engines, messages, params)['text'])
+        texts = merged
+        summary['rounds'] += 1
+    return dict(summary, text=texts[0])
+
+def _lanes(job):
+    return _params(job).get('concurrency') or Config.AI_CLEAN_CONCURRENCY
+
+@register('ai_clean', finalize=_reduce, concurrency=_lanes)
+def _map_batch(job, item):
+    params = _params(job)
+    nxt = (db.session.query(db.func.min(JobItem.ref_id))
+           .filter(JobItem.job_id == job.id, JobItem.ref_id > item.ref_id).scalar())
+    q = article_query(*_ARTICLE_COLUMNS, keyword=params.get('keyword'), source=params.get('source')).filter(CollectionDetail.id >= item.ref_id)
+    q = q.filter(CollectionDetail.id < nxt) if nxt is not None else q.filter(CollectionDetail.id <= params['max_id'])
+    articles = [_article(r, params['cap']) for r in q.order_by(CollectionDetail.id)]
+    if not articles:
+        return {'articles': 0, 'text': ''}
+    res = _call(_engines(params), build_messages(params.get('task'), articles), params)
+    return {'articles': len(articles), 'first_id': articles[0]['id'], 'last_id': articles[-1]['id'],
+            'text': res['text'], 'cached': res.get('cached', False), 'engine_id': res.get('engine_id')}
@@ -0,0 +1,185 @@
+import json
+from ..config import Config
+
+def is_azure(engine) -> bool:
+    host = (engine.api_url or '').lower()
+    prov = (engine.provider or '').lower()
+    return ('.azure.com' in host) or ('azure' in prov)
+
+def build_request(engine, messages: list, stream: bool = False):
+    headers = {'Content-Type': 'application/json'}
+    payload = {'messages': messages}
+    if is_azure(engine):
+        if engine.api_key:
+            headers['api-key'] = engine.api_key
+        # Azure 路径携带 deployment，payload通常无需 model 字段
+    else:
+        if engine.api_key:
+            headers['Authorization'] = f'Bearer {engine.api_key}'
+        payload['model'] = engine.model_name
+    if stream:
+        payload['stream'] = True
+        headers['Accept'] = 'text/event-stream'
+    return headers, payload
+
+def _error_message(data, status):
+    msg = None
+    if isinstance(data, dict):
+        err = data.get('error')
+        if isinstance(err, dict):
+            msg = err.get('message') or err.get('code') or str(err)
+        elif isinstance(err, str):
+            msg = err
+    return msg or f'HTTP {status}'
+
+def _message_text(data):
+    if not isinstance(data, dict):
+        return None
+    choices = data.get('choices')
+    if isinstance(choices, list) and choices:
+        return (choices[0].get('message') or {}).get('content')
+    if isinstance(data.get('message'), dict):
+        return data['message'].get('content')
+    return None
+
+def _delta(chunk):
+    # OpenAI and Azure both send choices[0].delta; Azure's first chunk only
+    # carries prompt_filter_results with an empty choices list
+    choices = chunk.get('choices') if isinstance(chunk, dict) else None
+    if not choices:
+        return None, None
+    c = choices[0]
+    delta = c.get('delta') or c.get('message') or {}
+    return delta.get('content'), c.get('finish_reason')
+
+def iter_sse(lines):
+    # yields the payload of each data: field, joining multi-line events
+    buf = []
+    for raw in lines:
+        line = raw.decode('utf-8', 'replace') if isinstance(raw, bytes) else raw
+        line = line.rstrip('\r')
+        if not line:
+            if buf:
+                yield '\n'.join(buf)
+                buf = []
+            continue
+        if line.startswith(':'):
+            continue
+        if line.startswith('data:'):
+            buf.append(line[5:].lstrip(' '))
+    if buf:
+        yield '\n'.join(buf)
+
+def stream(engine, messages: list, bypass_cache: bool = False):
+    """Yields {'type': 'delta'|'done'|'error', ...} records as the completion
+    arrives. Closing the generator closes the upstream connection, which is
+    how a disconnected browser cancels the request. Cached answers come back
+    as a single delta; bypass_cache skips the lookup but still refreshes."""
+    from .cache import response_cache, cache_key
+    headers, payload = build_request(engine, messages, stream=True)
+    key = cache_key(engine, payload)
+    if bypass_cache:
+        response_cache.count('bypassed')
+    else:
+        hit = response_cache.get(key)
+        if hit is not None:
+            if hit.get('text'):
+                yield {'type': 'delta', 'text': hit['text']}
+            yield {'type': 'done', 'finish_reason': hit.get('finish_reason'), 'usage': hit.get('usage'), 'cached': True}
+            return
+    parts = []
+    up = _upstream(engine, headers, payload)
+    try:
+        for ev in up:
+            if ev['type'] == 'delta':
+                parts.append(ev['text'])
+            elif ev['type'] == 'done' and parts:
+                # only complete answers are stored; errors and disconnects never get here
+                try:
+                    response_cache.put(key, engine, {'text': ''.join(parts), 'finish_reason': ev.get('finish_reason'), 'usage': ev.get('usage')})
+                except Exception:
+                    pass
+            yield ev
+    finally:
+        up.close()
+
+def _retryable(status) -> bool:
+    # worth sending to another engine: no answer at all, throttled, or server-side failure
+    return status is None or status == 429 or status >= 500
+
+def _upstream(engine, headers: dict, payload: dict):
+    from ..collector import client
+    from ..collector.throttle import _parse_retry_after
+    try:
+        # pooled connections, but not the crawler's per-host scheduler: the
+        # engine pool enforces per-engine concurrency and 429 backoff itself.
+        # The read timeout applies between chunks, not to the whole completion.
+        resp = client.get_session().post(engine.api_url, json=payload, headers=headers, stream=True,
+                                         timeout=(Config.AI_CONNECT_TIMEOUT, Config.AI_READ_TIMEOUT))
+    except Exception as e:
+        yield {'type': 'error', 'message': str(e), 'status': None, 'retryable': True}
+        return
+    finish = None
+    usage = None
+    try:
+        status = resp.status_code
+        ctype = (resp.headers.get('Content-Type') or '').lower()
+        if status >= 400 or 'text/event-stream' not in ctype:
+            # error bodies and servers that ignore stream=true answer with plain JSON
+            try:
+                data = json.loads(resp.content or b'null')
+            except ValueError:
+                data = None
+            if status >= 400:
+                yield {'type': 'error', 'message': _error_message(data, status), 'status': status,
+                       'retryable': _retryable(status), 'retry_after': _parse_retry_after(resp.headers.get('Retry-After'))}
+                return
+            txt = _message_text(data) or ''
+            if txt:
+                yield {'type': 'delta', 'text': txt}
+            yield {'type': 'done', 'finish_reason': None,
+                   'usage': data.get('usage') if isinstance(data, dict) else None}
+            return
+        for data in iter_sse(resp.iter_lines(chunk_size=512)):
+            if data.strip() == '[DONE]':
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            if isinstance(chunk, dict) and chunk.get('error'):
+                yield {'type': 'error', 'message': _error_message(chunk, status), 'status': status, 'retryable': False}
+                return
+            txt, reason = _delta(chunk)
+            finish = reason or finish
+            if isinstance(chunk, dict) and chunk.get('usage'):
+                usage = chunk['usage']
+            if txt:
+                yield {'type': 'delta', 'text': txt}
+        yield {'type': 'done', 'finish_reason': finish, 'usage': usage}
+    except Exception as e:
+        # read timeout or dropped connection; only safe to retry if nothing was sent yet
+        yield {'type': 'error', 'message': str(e), 'status': None, 'retryable': True}
+    finally:
+        resp.close()
+
+def collect(events):
+    # folds a stream of records into the JSON shape of the blocking endpoints
+    parts = []
+    for ev in events:
+        if ev['type'] == 'delta':
+            parts.append(ev['text'])
+        elif ev['type'] == 'error':
+            return {'status': 'error', 'message': ev['message'], 'engine_id': ev.get('engine_id')}
+        elif ev['type'] == 'done':
+            return {'status': 'ok', 'text': ''.join(parts), 'cached': bool(ev.get('cached')), 'engine_id': ev.get('engine_id'),
+                    'raw': {'finish_reason': ev.get('finish_reason'), 'usage': ev.get('usage')}}
+    return {'status': 'ok', 'text': ''.join(parts), 'raw': None}
+
+def call(engine, messages: list, bypass_cache: bool = False):
+    # blocking wrapper kept for JSON endpoints; streams underneath so long
+    # completions only need to keep producing tokens, not finish in one timeout
+    return collect(stream(engine, messages, bypass_cache))
+
+def sse(rec: dict) -> str:
+    return f'event: {rec["type"]}\ndata: {json.dumps(rec, ensure_ascii=False)}\n\n'
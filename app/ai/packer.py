@@ -0,0 +1,105 @@
+import json
+import math
+import re
+from ..config import Config
+
+# CJK ideographs, kana, hangul and full-width forms cost about one token each
+# in the BPE vocabularies OpenAI-style models use; other text averages about
+# four characters per token. Cheap enough to run over the whole warehouse.
+_CJK = re.compile(r'[　-ヿ㐀-䶿一-鿿가-힯豈-﫿＀-￯]')
+_SPACES = re.compile(r'[ \t 　]+')
+# short lines that carry no content: bylines, share/follow prompts, copyright footers
+_BOILERPLATE = re.compile(
+    r'^(责任编辑|编辑|来源|原标题|作者|记者|通讯员|审核|校对|监制|出品|图片来源|版权|免责声明|声明[:：]|'
+    r'扫码|扫描二维码|长按|关注|点击|分享到|举报|打开|下载|相关阅读|延伸阅读|推荐阅读|相关新闻|更多精彩|'
+    r'上一篇|下一篇|返回|网站地图|ICP|Copyright|©)|版权所有|未经授权|转载请注明|All Rights Reserved', re.I)
+_BOILERPLATE_MAX = 60
+ELLIPSIS = '……'
+# per-message framing (role, separators) in chat completion requests
+MESSAGE_TOKENS = 4
+# the estimate can undercount rare ideographs, keep some headroom
+SAFETY = 0.05
+
+def estimate_tokens(text: str | None) -> int:
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def messages_tokens(messages: list) -> int:
+    return sum(estimate_tokens(m.get('content') if isinstance(m.get('content'), str) else json.dumps(m.get('content'), ensure_ascii=False)) + MESSAGE_TOKENS
+               for m in messages)
+
+def engine_budget(engine) -> int:
+    # prompt tokens available for one call: context window minus the output reserve
+    ctx = getattr(engine, 'context_tokens', None) or Config.AI_CONTEXT_TOKENS
+    reserve = getattr(engine, 'output_reserve', None) or Config.AI_OUTPUT_RESERVE
+    return max(256, int((ctx - reserve) * (1 - SAFETY)))
+
+def strip_boilerplate(text: str | None) -> str:
+    out = []
+    seen = set()
+    for line in (text or '').splitlines():
+        line = _SPACES.sub(' ', line).strip()
+        if not line or line in seen:
+            continue
+        if len(line) <= _BOILERPLATE_MAX and _BOILERPLATE.search(line):
+            continue
+        seen.add(line)
+        out.append(line)
+    return '\n'.join(out)
+
+def clip(text: str | None, max_tokens: int, head: float = 0.7) -> str:
+    # keeps the opening (lead, key facts) and the ending (conclusion, dates)
+    # of an over-long text and drops the middle
+    text = strip_boilerplate(text)
+    total = estimate_tokens(text)
+    if total <= max_tokens:
+        return text
+    keep = max(0, int(max_tokens * len(text) / total) - len(ELLIPSIS))
+    while True:
+        h = int(keep * head)
+        t = keep - h
+        out = text[:h] + ELLIPSIS + (text[-t:] if t > 0 else '')
+        # density differs between head and tail; shrink until the estimate fits
+        over = estimate_tokens(out) - max_tokens
+        if over <= 0 or keep == 0:
+            return out
+        keep = max(0, keep - max(over, keep // 20))
+
+def item_tokens(item) -> int:
+    # an element of a JSON array in the prompt, plus its separator
+    return estimate_tokens(json.dumps(item, ensure_ascii=False)) + 1
+
+def pack(items, budget: int, cost=item_tokens):
+    """Next-fit packing that keeps input order: yields lists whose summed cost
+    stays within budget. An item larger than the budget goes out alone."""
+    batch = []
+    used = 0
+    for it in items:
+        c = cost(it)
+        if batch and used + c > budget:
+            yield batch
+            batch = []
+            used = 0
+        batch.append(it)
+        used += c
+    if batch:
+        yield batch
+
+def fit_messages(messages: list, budget: int) -> list:
+    # keeps system messages and the newest turns; older turns are dropped
+    # first and an oversized latest message is clipped
+    system = [m for m in messages if m.get('role') == 'system']
+    turns = [m for m in messages if m.get('role') != 'system']
+    left = budget - messages_tokens(system)
+    kept = []
+    for m in reversed(turns):
+        cost = messages_tokens([m])
+        if cost > left:
+            if not kept and isinstance(m.get('content'), str):
+                kept.append(dict(m, content=clip(m['content'], max(0, left - MESSAGE_TOKENS))))
+            break
+        kept.append(m)
+        left -= cost
+    return system + kept[::-1]
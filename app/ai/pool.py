@@ -0,0 +1,163 @@
+import threading
+import time
+from ..extensions import db
+from ..models import AIEngine
+from ..config import Config
+from . import engine as ai_engine
+
+# weight of the newest sample in the latency / error-rate moving averages
+ALPHA = 0.3
+# how much a 100% error rate multiplies an engine's latency score
+ERROR_PENALTY = 4
+MAX_COOLDOWN = 60
+
+def parse_tags(raw: str | None) -> set:
+    return {t.strip().lower() for t in (raw or '').replace('，', ',').split(',') if t.strip()}
+
+def engine_tags(eng) -> set:
+    return parse_tags(eng.tags)
+
+def candidates(tag: str | None = None):
+    rows = db.session.query(AIEngine).filter_by(enabled=True).order_by(AIEngine.id).all()
+    if tag:
+        rows = [r for r in rows if tag.strip().lower() in engine_tags(r)]
+    return rows
+
+def with_fallbacks(eng):
+    # an explicitly chosen engine first, then enabled engines sharing one of
+    # its tags whose prompt budget holds anything sized for it; an untagged
+    # engine has no fallbacks
+    from .packer import engine_budget
+    tags = engine_tags(eng)
+    if not tags:
+        return [eng]
+    budget = engine_budget(eng)
+    return [eng] + [e for e in candidates() if e.id != eng.id and engine_tags(e) & tags and engine_budget(e) >= budget]
+
+class _EngineState:
+    __slots__ = ('latency', 'errors', 'in_flight', 'limit', 'fails', 'cooldown_until', 'calls')
+
+    def __init__(self):
+        self.latency = None
+        self.errors = 0.0
+        self.in_flight = 0
+        self.limit = Config.AI_ENGINE_CONCURRENCY
+        self.fails = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+
+# Routes each request to the enabled engine with the best score: EWMA of time
+# to first token, inflated by the EWMA error rate and current load. Each engine
+# admits at most max_concurrency requests; a 429/5xx or connection failure
+# before any output is retried on an engine not tried yet. With `prefer` that
+# engine is used whenever it is not cooling down (waiting for a free slot if
+# needed) and the others only take over from it. State is per process.
+class EnginePool:
+    def __init__(self):
+        self._state = {}
+        self._cond = threading.Condition()
+
+    def _get(self, eng):
+        st = self._state.get(eng.id)
+        if st is None:
+            st = self._state[eng.id] = _EngineState()
+        st.limit = eng.max_concurrency or Config.AI_ENGINE_CONCURRENCY
+        return st
+
+    @staticmethod
+    def _score(st):
+        # engines without a sample score 0 so they get tried early
+        return (st.latency or 0.0) * (1 + ERROR_PENALTY * st.errors) * (1 + st.in_flight / st.limit)
+
+    def acquire(self, engines, exclude=(), timeout: float | None = None, prefer=None):
+        deadline = time.monotonic() + (Config.AI_POOL_WAIT if timeout is None else timeout)
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                pool = [(e, self._get(e)) for e in engines if e.id not in exclude]
+                if not pool:
+                    return None
+                if prefer is not None and prefer.id not in exclude and self._get(prefer).cooldown_until <= now:
+                    pool = [(prefer, self._get(prefer))]
+                free = [(e, st) for e, st in pool if st.in_flight < st.limit]
+                ready = [(e, st) for e, st in free if st.cooldown_until <= now]
+                if ready:
+                    e, st = min(ready, key=lambda p: (self._score(p[1]), p[1].in_flight, p[0].id))
+                    st.in_flight += 1
+                    st.calls += 1
+                    return e
+                left = deadline - now
+                if left <= 0:
+                    return None
+                # nothing free: sleep until a slot is released or a cooldown ends
+                waits = [st.cooldown_until - now for _, st in free]
+                self._cond.wait(max(0.01, min(waits + [left])))
+
+    def release(self, eng, latency: float | None = None, error: dict | None = None):
+        with self._cond:
+            st = self._get(eng)
+            st.in_flight = max(0, st.in_flight - 1)
+            if latency is not None:
+                st.latency = latency if st.latency is None else (1 - ALPHA) * st.latency + ALPHA * latency
+                st.errors *= 1 - ALPHA
+                st.fails = 0
+            elif error is not None:
+                st.errors = (1 - ALPHA) * st.errors + ALPHA
+                st.fails += 1
+                backoff = 0
+                if error.get('status') == 429:
+                    backoff = error.get('retry_after') or min(MAX_COOLDOWN, 2 ** st.fails)
+                elif st.fails >= 2:
+                    backoff = min(MAX_COOLDOWN, 2 ** st.fails)
+                st.cooldown_until = max(st.cooldown_until, time.monotonic() + backoff)
+            self._cond.notify_all()
+
+    def stream(self, engines, messages: list, bypass_cache: bool = False, prefer=None):
+        """engine.stream over the pool; done/error records carry engine_id."""
+        tried = set()
+        last = None
+        for _ in range(Config.AI_POOL_RETRIES + 1):
+            eng = self.acquire(engines, tried, prefer=prefer)
+            if eng is None:
+                break
+            tried.add(eng.id)
+            started = time.monotonic()
+            latency = None
+            error = None
+            sent = False
+            gen = ai_engine.stream(eng, messages, bypass_cache)
+            try:
+                for ev in gen:
+                    if ev['type'] == 'error':
+                        error = dict(ev, engine_id=eng.id)
+                        break
+                    if latency is None:
+                        latency = time.monotonic() - started
+                    if ev['type'] == 'done':
+                        if ev.get('cached'):
+                            latency = None
+                        ev = dict(ev, engine_id=eng.id)
+                    sent = sent or ev['type'] == 'delta'
+                    yield ev
+            finally:
+                gen.close()
+                self.release(eng, latency if error is None else None, error)
+            if error is None:
+                return
+            last = error
+            if sent or not error.get('retryable'):
+                break
+        yield last or {'type': 'error', 'message': 'no AI engine available', 'retryable': False}
+
+    def call(self, engines, messages: list, bypass_cache: bool = False, prefer=None):
+        return ai_engine.collect(self.stream(engines, messages, bypass_cache, prefer))
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._cond:
+            return {eid: {'latency': round(st.latency, 3) if st.latency is not None else None,
+                          'error_rate': round(st.errors, 3), 'in_flight': st.in_flight, 'limit': st.limit,
+                          'calls': st.calls, 'cooldown': round(max(0.0, st.cooldown_until - now), 1)}
+                    for eid, st in self._state.items()}
+
+engine_pool = EnginePool()
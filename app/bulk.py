@@ -0,0 +1,23 @@
+from .extensions import db
+
+# SQLite caps bound parameters per statement (999 before 3.32)
+CHUNK = 500
+
+def chunked(seq, n: int = CHUNK):
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+def parse_ids(data: dict):
+    ids = list(data.get('ids') or [])
+    if data.get('id'):
+        ids.append(data['id'])
+    return list(dict.fromkeys(int(i) for i in ids if i))
+
+def delete_in(column, ids):
+    # DELETE ... WHERE column IN (...) per chunk; returns rows removed
+    model = column.class_
+    n = 0
+    for part in chunked(ids):
+        n += db.session.query(model).filter(column.in_(part)).delete(synchronize_session=False)
+    return n
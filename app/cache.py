@@ -0,0 +1,152 @@
+import threading
+import time
+from flask_login import UserMixin
+from .extensions import db
+from .models import User, Setting, CacheVersion
+from .config import Config
+
+_MISS = object()
+
+# Small thread-safe TTL cache. Entries also drop on invalidate(), which
+# writers call so this process never serves a value it knows is stale.
+class TTLCache:
+    def __init__(self, ttl: float, maxsize: int = 1024):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None or hit[0] < time.monotonic():
+                return default
+            return hit[1]
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.maxsize:
+                now = time.monotonic()
+                self._data = {k: v for k, v in self._data.items() if v[0] >= now}
+                if len(self._data) >= self.maxsize:
+                    self._data.pop(next(iter(self._data)))
+            self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def get_or_set(self, key, fn):
+        value = self.get(key, _MISS)
+        if value is _MISS:
+            value = fn()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=_MISS):
+        with self._lock:
+            if key is _MISS:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+# row totals for list pages, keyed per filter
+count_cache = TTLCache(Config.COUNT_CACHE_TTL)
+
+class CachedRole:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, r):
+        self.id = r.id
+        self.name = r.name
+
+class CachedUser(UserMixin):
+    # detached, read-only copy of a User row; safe to share across requests
+    def __init__(self, u):
+        self.id = u.id
+        self.username = u.username
+        self.role_id = u.role_id
+        self.role = CachedRole(u.role) if u.role else None
+
+class CachedSetting:
+    __slots__ = ('id', 'app_name', 'logo_path')
+
+    def __init__(self, s):
+        self.id = s.id
+        self.app_name = s.app_name
+        self.logo_path = s.logo_path
+
+# Cross-process invalidation stamp: a CacheVersion row that writers bump and
+# readers poll at most every CACHE_VERSION_INTERVAL seconds.
+class VersionStamp:
+    def __init__(self, name: str):
+        self.name = name
+        self._version = None
+        self._checked = 0.0
+
+    def changed(self):
+        now = time.monotonic()
+        if now - self._checked < Config.CACHE_VERSION_INTERVAL:
+            return False
+        self._checked = now
+        try:
+            v = db.session.query(CacheVersion.version).filter_by(name=self.name).scalar()
+        except Exception:
+            db.session.rollback()
+            return False
+        if v == self._version:
+            return False
+        self._version = v
+        return True
+
+    def bump(self):
+        try:
+            n = db.session.query(CacheVersion).filter_by(name=self.name).update({'version': CacheVersion.version + 1})
+            if not n:
+                db.session.add(CacheVersion(name=self.name, version=1))
+            db.session.commit()
+            # our own copy is already cleared; recheck on the next read
+            self._version = None
+            self._checked = 0.0
+        except Exception:
+            db.session.rollback()
+
+# Setting/User/Role snapshots for load_user and the template context. Writers
+# call invalidate(), which also bumps a CacheVersion row so other worker
+# processes drop their copies at their next check (CACHE_VERSION_INTERVAL).
+class IdentityCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = {}
+        self._setting = _MISS
+        self._stamp = VersionStamp('identity')
+
+    def _clear(self):
+        with self._lock:
+            self._users = {}
+            self._setting = _MISS
+
+    def _sync(self):
+        if self._stamp.changed():
+            self._clear()
+
+    def user(self, user_id: int):
+        self._sync()
+        hit = self._users.get(user_id, _MISS)
+        if hit is _MISS:
+            u = db.session.get(User, user_id)
+            hit = CachedUser(u) if u else None
+            with self._lock:
+                self._users[user_id] = hit
+        return hit
+
+    def setting(self):
+        self._sync()
+        hit = self._setting
+        if hit is _MISS:
+            s = db.session.query(Setting).first()
+            hit = self._setting = CachedSetting(s) if s else None
+        return hit
+
+    def invalidate(self, broadcast: bool = True):
+        self._clear()
+        if broadcast:
+            self._stamp.bump()
+
+identity_cache = IdentityCache()
@@ -0,0 +1,106 @@
+import click
+from .extensions import db
+
+def register_cli(app):
+    @app.cli.command('seed')
+    def seed():
+        """Create default roles, the admin account and app settings if missing."""
+        from .seed import seed_defaults
+        added = seed_defaults()
+        click.echo('seeded: ' + ', '.join(added) if added else 'nothing to seed')
+
+    @app.cli.command('simhash-backfill')
+    @click.option('--batch', default=500, show_default=True)
+    def simhash_backfill(batch):
+        """Fingerprint existing collection details and link near-duplicates."""
+        from .collector.simhash import backfill
+        n = backfill(batch)
+        click.echo(f'fingerprinted {n} details')
+
+    @app.cli.command('canonical-prune')
+    def canonical_prune():
+        """Drop redirect cache entries older than CANONICAL_TTL."""
+        from .collector.canonical import prune_expired
+        n = prune_expired()
+        db.session.commit()
+        click.echo(f'pruned {n} cached redirects')
+
+    @app.cli.command('ai-cache-prune')
+    def ai_cache_prune():
+        """Drop AI responses cached longer than AI_CACHE_TTL."""
+        from .ai.cache import response_cache
+        n = response_cache.prune_expired()
+        db.session.commit()
+        click.echo(f'pruned {n} cached AI responses')
+
+    @app.cli.command('ingest')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--keyword', default=None, help='Keyword for items that carry none.')
+    @click.option('--chunk', default=1000, show_default=True)
+    @click.option('--no-canonical', is_flag=True, help='Skip redirect resolution.')
+    def ingest(path, keyword, chunk, no_canonical):
+        """Bulk upsert collection items from a JSON array or JSON-lines file."""
+        import json
+        from .collector.ingest import upsert_items
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        stripped = text.lstrip()
+        if stripped.startswith('['):
+            items = json.loads(stripped)
+        else:
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        n = upsert_items(items, keyword=keyword, canonicalize=not no_canonical, chunk=chunk)
+        click.echo(f'saved {n} items')
+
+    @app.cli.command('purge-items')
+    @click.option('--keyword', default=None)
+    @click.option('--source', default=None)
+    @click.option('--older-than-days', type=float, default=None)
+    @click.option('--dry-run', is_flag=True)
+    def purge_items_cmd(keyword, source, older_than_days, dry_run):
+        """Delete collection items (with details and blobs) matching the filters."""
+        from .collector.purge import purge_by_filter
+        try:
+            res = purge_by_filter(dry_run=dry_run, keyword=keyword, source=source, older_than_days=older_than_days)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        click.echo(', '.join(f'{k}={v}' for k, v in res.items()))
+
+    @app.cli.command('search-rebuild')
+    def search_rebuild():
+        """Rebuild the warehouse full-text index from scratch."""
+        from .collector.search import rebuild
+        n = rebuild()
+        click.echo(f'indexed {n} items')
+
+    @app.cli.command('db-bench')
+    @click.option('--readers', default=4, show_default=True)
+    @click.option('--writers', default=2, show_default=True)
+    @click.option('--seconds', default=5.0, show_default=True)
+    def db_bench(readers, writers, seconds):
+        """Compare concurrent read/write throughput: sqlite defaults vs the configured profile."""
+        from .sqlite_profile import benchmark, profile_from_config
+        if db.engine.dialect.name != 'sqlite':
+            raise click.UsageError('db-bench only supports SQLite')
+        path = db.engine.url.database
+        res = benchmark(path, profile_from_config(app.config), readers, writers, seconds)
+        for name, r in res.items():
+            click.echo(f"{name:8} reads/s={r['reads_per_s']:>9} write tx/s={r['write_tx_per_s']:>8} locked={r['locked_errors']}")
+
+    @app.cli.command('import-report')
+    @click.option('--top', default=15, show_default=True)
+    @click.option('--budget-ms', type=float, default=None, help='Exit non-zero when total import time exceeds this.')
+    @click.option('--forbid', multiple=True, help='Module that must not be imported at startup (e.g. bs4).')
+    def import_report(top, budget_ms, forbid):
+        """Report startup import cost from python -X importtime."""
+        from .importtime import measure
+        rows, total = measure()
+        for cum, own, name in rows[:top]:
+            click.echo(f'{cum / 1000:9.1f} ms {own / 1000:8.1f} ms  {name}')
+        click.echo(f'total {total / 1000:.1f} ms')
+        loaded = {name for _, _, name in rows}
+        bad = [m for m in forbid if m in loaded]
+        if bad:
+            raise click.ClickException('imported at startup: ' + ', '.join(bad))
+        if budget_ms is not None and total / 1000 > budget_ms:
+            raise click.ClickException(f'startup imports took {total / 1000:.1f} ms, budget {budget_ms} ms')
@@ -0,0 +1,52 @@
+import hashlib
+import zlib
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..extensions import db
+from ..models import HtmlBlob, CollectionDetail
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+def _compress(raw: bytes):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=6).compress(raw)
+    return 'zlib', zlib.compress(raw, 6)
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read this blob')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def put_html(text: str | None):
+    # content-addressed: identical pages share one row; returns the hash
+    if not text:
+        return None
+    raw = text.encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()
+    # key-only probe: skips compressing a page we already hold without
+    # loading its blob into the session
+    if db.session.query(HtmlBlob.hash).filter(HtmlBlob.hash == digest).first() is not None:
+        return digest
+    codec, data = _compress(raw)
+    row = {'hash': digest, 'codec': codec, 'size': len(raw), 'data': data}
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(sqlite_insert(HtmlBlob).values(**row).on_conflict_do_nothing(index_elements=['hash']))
+    else:
+        db.session.add(HtmlBlob(**row))
+    return digest
+
+def get_html(digest: str | None):
+    if not digest:
+        return None
+    row = db.session.get(HtmlBlob, digest)
+    if row is None:
+        return None
+    return _decompress(row.codec, row.data).decode('utf-8')
+
+def prune_orphans():
+    used = db.session.query(CollectionDetail.html_hash).filter(CollectionDetail.html_hash.isnot(None))
+    return db.session.query(HtmlBlob).filter(HtmlBlob.hash.notin_(used)).delete(synchronize_session=False)
@@ -0,0 +1,145 @@
+import re
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlunsplit, unquote_plus, urljoin
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..extensions import db
+from ..models import UrlCanonical
+from ..config import Config
+from . import client
+from .service import _default_headers
+
+TRACKING_PARAMS = {
+    'spm', 'from', 'wfr', 'fr', 'isappinstalled', 'scene', 'clicktime', 'enterid',
+    'share_token', 'sharer_shareinfo', 'sharer_shareinfo_first', 'share_from', 'shareid',
+}
+TRACKING_PREFIXES = ('utm_',)
+MAX_HOPS = 5
+
+_resolve_pool = ThreadPoolExecutor(max_workers=Config.CANONICAL_WORKERS, thread_name_prefix='canonical')
+# baidu/link sometimes answers 200 with a meta refresh or location.replace()
+_SCRIPT_TARGET = re.compile(r'''(?:location\.replace\(|location\.href\s*=\s*|URL=)\s*['"]?([^'")\s>]+)''', re.I)
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _is_tracking(pair: str) -> bool:
+    k = unquote_plus(pair.split('=', 1)[0]).lower()
+    return k in TRACKING_PARAMS or k.startswith(TRACKING_PREFIXES)
+
+def strip_tracking(url: str) -> str:
+    # drops tracking parameters only; the other query pairs keep their raw
+    # encoding and order, and hash-routed fragments (#/path, #!path) are kept
+    # because they identify the article on single-page sites
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+        netloc = netloc.rsplit(':', 1)[0]
+    query = '&'.join(p for p in parts.query.split('&') if p and not _is_tracking(p))
+    fragment = parts.fragment if parts.fragment.startswith(('/', '!')) else ''
+    return urlunsplit((scheme, netloc, parts.path or '/', query, fragment))
+
+def is_redirector(url: str) -> bool:
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    return (host == 'baidu.com' or host.endswith('.baidu.com')) and parts.path.startswith('/link')
+
+def _next_hop(url: str, caller):
+    # HEAD without following; some redirectors reject HEAD or answer with a
+    # refresh page, so fall back to a streamed GET that only reads the head
+    headers = _default_headers()
+    r = client.request('HEAD', url, caller=caller, headers=headers, allow_redirects=False)
+    if 300 <= r.status_code < 400 and r.headers.get('Location'):
+        return urljoin(url, r.headers['Location'])
+    r = client.request('GET', url, caller=caller, headers=headers, allow_redirects=False, stream=True)
+    try:
+        if 300 <= r.status_code < 400 and r.headers.get('Location'):
+            return urljoin(url, r.headers['Location'])
+        if r.status_code == 200:
+            head = next(r.iter_content(4096), b'').decode(r.encoding or 'utf-8', 'ignore')
+            m = _SCRIPT_TARGET.search(head)
+            if m:
+                return urljoin(url, m.group(1))
+    finally:
+        r.close()
+    return None
+
+def resolve(url: str, caller=None):
+    # follows redirector hops until a non-redirector URL; None when unresolved
+    cur = url
+    for _ in range(MAX_HOPS):
+        nxt = _next_hop(cur, caller)
+        if not nxt:
+            return None
+        if not is_redirector(nxt):
+            return nxt
+        cur = nxt
+    return None
+
+def store_resolved(resolved: dict):
+    now = _utcnow()
+    rows = [{'url': k, 'canonical': v, 'resolved_at': now} for k, v in resolved.items()]
+    if not rows:
+        return
+    if db.engine.dialect.name == 'sqlite':
+        stmt = sqlite_insert(UrlCanonical).values(rows)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['url'],
+            set_={'canonical': stmt.excluded.canonical, 'resolved_at': stmt.excluded.resolved_at}))
+    else:
+        for row in rows:
+            db.session.merge(UrlCanonical(**row))
+
+def canonicalize_many(urls, timeout: float | None = None):
+    # Returns {url: canonical}. Redirector links are answered from the
+    # UrlCanonical cache while fresh and otherwise resolved concurrently;
+    # links that fail to resolve, or are still queued when timeout seconds
+    # have passed, map to themselves and are not cached. Caller commits.
+    out = {}
+    pending = set()
+    for u in urls:
+        if not u or u in out:
+            continue
+        if is_redirector(u):
+            out[u] = u
+            pending.add(u)
+        else:
+            out[u] = strip_tracking(u)
+    if not pending:
+        return out
+    cutoff = _utcnow() - timedelta(seconds=Config.CANONICAL_TTL)
+    hits = (db.session.query(UrlCanonical.url, UrlCanonical.canonical)
+            .filter(UrlCanonical.url.in_(list(pending)), UrlCanonical.resolved_at >= cutoff).all())
+    for u, c in hits:
+        out[u] = c
+        pending.discard(u)
+    if not pending:
+        return out
+    # one caller per batch so a large save queues fairly against other work
+    caller = object()
+
+    def _one(u):
+        try:
+            return u, resolve(u, caller)
+        except Exception:
+            return u, None
+
+    futs = [_resolve_pool.submit(_one, u) for u in pending]
+    done, late = wait(futs, timeout=timeout)
+    for f in late:
+        f.cancel()
+    resolved = {}
+    for f in done:
+        u, target = f.result()
+        if target:
+            resolved[u] = out[u] = strip_tracking(target)
+    store_resolved(resolved)
+    return out
+
+def canonical_url(url: str, timeout: float | None = None) -> str:
+    return canonicalize_many([url], timeout=timeout).get(url, url)
+
+def prune_expired():
+    cutoff = _utcnow() - timedelta(seconds=Config.CANONICAL_TTL)
+    return db.session.query(UrlCanonical).filter(UrlCanonical.resolved_at < cutoff).delete(synchronize_session=False)
@@ -0,0 +1,70 @@
+import os
+import threading
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+from ..config import Config
+from .throttle import scheduler
+
+_lock = threading.Lock()
+_session = None
+_session_pid = None
+
+def _seed_cookies(jar, raw: str | None, domain: str):
+    for part in (raw or '').split(';'):
+        if '=' not in part:
+            continue
+        k, v = part.split('=', 1)
+        k = k.strip()
+        if k:
+            jar.set(k, v.strip(), domain=domain, path='/')
+
+def _build_session():
+    s = requests.Session()
+    retry = Retry(total=Config.HTTP_MAX_RETRIES, connect=Config.HTTP_MAX_RETRIES, read=0, status=0, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_CONNECTIONS, pool_maxsize=Config.HTTP_POOL_MAXSIZE, max_retries=retry)
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    # gzip/deflate always; br is advertised only when brotli is installed
+    s.headers['Accept-Encoding'] = DEFAULT_ACCEPT_ENCODING
+    _seed_cookies(s.cookies, os.getenv('BAIDU_COOKIE'), '.baidu.com')
+    return s
+
+def get_session() -> requests.Session:
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+    with _lock:
+        # rebuild after fork so workers never share sockets with the parent
+        if _session is None or _session_pid != pid:
+            _session = _build_session()
+            _session_pid = pid
+    return _session
+
+def reset_session():
+    global _session, _session_pid
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _session_pid = None
+
+def request(method: str, url: str, caller=None, **kwargs):
+    kwargs.setdefault('timeout', Config.HTTP_TIMEOUT)
+    host = urlparse(url).hostname or ''
+    lim = scheduler.acquire(host, caller if caller is not None else threading.get_ident(), Config.HTTP_QUEUE_TIMEOUT)
+    resp = None
+    try:
+        resp = get_session().request(method, url, **kwargs)
+        return resp
+    finally:
+        scheduler.release(lim, resp)
+
+def get(url: str, **kwargs):
+    return request('GET', url, **kwargs)
+
+def post(url: str, **kwargs):
+    return request('POST', url, **kwargs)
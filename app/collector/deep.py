@@ -0,0 +1,145 @@
+import json
+from lxml import html, etree
+from ..extensions import db
+from ..models import CollectionItem, CollectionDetail
+from ..jobs import register
+from ..config import Config
+from .service import _default_headers
+from . import client
+from .rule_index import rule_index
+from .blobstore import put_html
+from .simhash import fingerprint_detail
+from .search import index_items
+
+def find_rules(it):
+    return rule_index.match(it.source, it.url)
+
+def _rule_headers(rule):
+    if rule and rule.request_headers:
+        try:
+            hdr = json.loads(rule.request_headers)
+            if isinstance(hdr, dict):
+                return hdr
+        except Exception:
+            pass
+    return _default_headers()
+
+def _join_text(ns):
+    return ' '.join([n.text_content().strip() for n in ns if hasattr(n, 'text_content')]).strip()
+
+_H1 = etree.XPath('//h1')
+_ARTICLE = etree.XPath('//article')
+_P = etree.XPath('//p')
+
+def _eval_xpath(doc, xp):
+    if xp is None:
+        return None
+    try:
+        return _join_text(xp(doc)) or None
+    except Exception:
+        return None
+
+class _Page:
+    # one download + one lxml parse; fallback extraction is computed lazily once
+    def __init__(self, resp):
+        self.resp = resp
+        self.doc = html.fromstring(resp.text)
+        self._title = None
+        self._content = None
+
+    def default_title(self):
+        if self._title is None:
+            self._title = _join_text(_H1(self.doc))
+        return self._title or None
+
+    def default_content(self):
+        if self._content is None:
+            txt = _join_text(_ARTICLE(self.doc))
+            if not txt:
+                ps = [p.text_content().strip() for p in _P(self.doc)]
+                txt = '\n'.join([t for t in ps if t])
+            self._content = txt
+        return self._content or None
+
+def save_detail(it, content_text, raw_html, final_url):
+    # re-runs update the item's existing detail row instead of adding another
+    html_hash = put_html(raw_html)
+    det = db.session.query(CollectionDetail).filter_by(item_id=it.id).order_by(CollectionDetail.id.desc()).first()
+    if det:
+        det.content_text = content_text
+        det.content_html = None
+        det.html_hash = html_hash
+        det.final_url = final_url
+    else:
+        det = CollectionDetail(item_id=it.id, content_text=content_text, html_hash=html_hash, final_url=final_url)
+        db.session.add(det)
+    fingerprint_detail(det)
+    return det
+
+def _store(it, rule, page, title_text, content_text):
+    content_text = content_text[:20000]
+    det = save_detail(it, content_text, page.resp.text, page.resp.url)
+
+    it.deep_status = True
+    if title_text and title_text != it.title:
+        it.title = title_text
+    index_items([it.id])
+
+    db.session.commit()
+    return {'id': it.id, 'detail_id': det.id, 'rule_used': rule.name if rule else 'default'}
+
+def deep_collect_item(it):
+    # Downloads the article once per distinct header set and evaluates every
+    # candidate rule's XPaths against the parsed document. The first rule whose
+    # own content XPath matches wins; otherwise the first page fetched is
+    # stored with the generic //article, //p extraction.
+    # Returns the result row, or None when nothing could be extracted.
+    rules = find_rules(it)
+
+    # If no rules found, use a dummy None rule to trigger default extraction
+    if not rules:
+        rules = [None]
+
+    pages = {}
+    fallback = None
+    last_error = None
+    for rule in rules:
+        headers = _rule_headers(rule)
+        key = tuple(sorted((str(k).lower(), str(v)) for k, v in headers.items()))
+        if key not in pages:
+            try:
+                pages[key] = _Page(client.get(it.url, headers=headers, timeout=15))
+            except Exception as e:
+                # remember the failure so rules sharing these headers skip the refetch
+                pages[key] = None
+                last_error = e
+        page = pages[key]
+        if page is None:
+            continue
+        if fallback is None:
+            fallback = (rule, page)
+        content_text = _eval_xpath(page.doc, rule.content_xp if rule else None)
+        if content_text:
+            title_text = _eval_xpath(page.doc, rule.title_xp) or page.default_title()
+            return _store(it, rule, page, title_text, content_text)
+
+    if fallback is not None:
+        rule, page = fallback
+        content_text = page.default_content()
+        if content_text:
+            title_text = _eval_xpath(page.doc, rule.title_xp if rule else None) or page.default_title()
+            return _store(it, rule, page, title_text, content_text)
+        return None
+    if last_error is not None:
+        raise last_error
+    return None
+
+@register('deep_collect', concurrency=lambda job: Config.DEEP_COLLECT_CONCURRENCY)
+def _deep_collect_job(job, item):
+    it = db.session.get(CollectionItem, item.ref_id)
+    if not it:
+        raise ValueError('item not found')
+    res = deep_collect_item(it)
+    if not res:
+        raise ValueError('no content extracted')
+    return res
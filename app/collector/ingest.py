@@ -0,0 +1,130 @@
+from sqlalchemy import func, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from ..extensions import db
+from ..models import CollectionItem, CollectionDetail
+from ..jobs import register, job_runner
+from ..config import Config
+from .canonical import canonicalize_many, is_redirector, resolve, strip_tracking, store_resolved
+from .search import index_items
+from .purge import purge_items
+from ..cache import count_cache
+
+FIELDS = ('title', 'cover', 'source', 'keyword')
+CHUNK = 1000
+
+def _merge(items, canon, defaults):
+    # one row per canonical URL; later duplicates only fill empty fields
+    merged = {}
+    for it in items:
+        raw = (it.get('url') or '').strip()
+        if not raw:
+            continue
+        url = canon.get(raw, raw)
+        row = merged.get(url)
+        if row is None:
+            row = merged[url] = {'url': url, 'raw': raw}
+            for k in FIELDS:
+                row[k] = it.get(k) or defaults.get(k) or None
+        else:
+            for k in FIELDS:
+                if not row[k] and it.get(k):
+                    row[k] = it[k]
+    return list(merged.values())
+
+def _adopt_legacy(rows):
+    # rows saved before canonicalization still carry the redirect link; move
+    # them to the canonical URL unless that URL already has its own row
+    moved = [r for r in rows if r['raw'] != r['url']]
+    for i in range(0, len(moved), CHUNK):
+        part = moved[i:i + CHUNK]
+        have = {u for (u,) in db.session.query(CollectionItem.url).filter(
+            CollectionItem.url.in_([r['url'] for r in part] + [r['raw'] for r in part]))}
+        for r in part:
+            if r['raw'] in have and r['url'] not in have:
+                db.session.execute(update(CollectionItem).where(CollectionItem.url == r['raw']).values(url=r['url']))
+                have.add(r['url'])
+
+def _upsert_sqlite(chunk):
+    stmt = sqlite_insert(CollectionItem)
+    ex = stmt.excluded
+    # same semantics as the old per-row path: blank incoming values keep the stored ones
+    set_ = {k: func.coalesce(func.nullif(getattr(ex, k), ''), getattr(CollectionItem, k)) for k in FIELDS}
+    # executemany over one compiled statement; no ORM objects are built
+    params = [{'url': r['url'], 'title': r['title'] or '', **{k: r[k] for k in FIELDS[1:]}} for r in chunk]
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['url'], set_=set_), params)
+
+def _upsert_orm(chunk):
+    found = {o.url: o for o in db.session.query(CollectionItem).filter(CollectionItem.url.in_([r['url'] for r in chunk]))}
+    for r in chunk:
+        obj = found.get(r['url'])
+        if obj is None:
+            db.session.add(CollectionItem(url=r['url'], title=r['title'] or '', **{k: r[k] for k in FIELDS[1:]}))
+            continue
+        for k in FIELDS:
+            if r[k]:
+                setattr(obj, k, r[k])
+
+def upsert_items(items, keyword: str | None = None, canonicalize: bool = True, chunk: int = CHUNK,
+                 resolve_timeout: float | None = None):
+    # Bulk save of crawler result dicts (url/title/cover/source/keyword) keyed
+    # on the canonical URL: one INSERT ... ON CONFLICT(url) DO UPDATE per
+    # chunk on SQLite, one IN lookup per chunk elsewhere. Commits per chunk.
+    # Redirect links not resolved within resolve_timeout are saved as-is
+    # (see unresolved_ids). Returns the number of distinct articles saved.
+    items = list(items)
+    canon = canonicalize_many([it.get('url') for it in items], timeout=resolve_timeout) if canonicalize else {}
+    rows = _merge(items, canon, {'keyword': keyword})
+    if not rows:
+        return 0
+    _adopt_legacy(rows)
+    write = _upsert_sqlite if db.engine.dialect.name == 'sqlite' else _upsert_orm
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        write(part)
+        index_items([iid for (iid,) in db.session.query(CollectionItem.id).filter(CollectionItem.url.in_([r['url'] for r in part]))])
+        db.session.commit()
+    count_cache.invalidate()
+    return len(rows)
+
+def save_items(items, keyword: str | None = None):
+    # request-path save: waits at most CANONICAL_RESOLVE_TIMEOUT for redirect
+    # links, then hands the rest to a background canonicalize job
+    items = list(items)
+    saved = upsert_items(items, keyword=keyword, resolve_timeout=Config.CANONICAL_RESOLVE_TIMEOUT)
+    ids = unresolved_ids(items)
+    job = job_runner.create('canonicalize', ids) if ids else None
+    return {'saved': saved, 'resolving': len(ids), 'job_id': job.id if job else None}
+
+def unresolved_ids(items):
+    # saved rows that still carry a redirect link, for the canonicalize job
+    raw = list({(it.get('url') or '').strip() for it in items} - {''})
+    raw = [u for u in raw if is_redirector(u)]
+    ids = []
+    for i in range(0, len(raw), CHUNK):
+        ids += [iid for (iid,) in db.session.query(CollectionItem.id).filter(CollectionItem.url.in_(raw[i:i + CHUNK]))]
+    return sorted(ids)
+
+@register('canonicalize', concurrency=lambda job: min(Config.CANONICAL_WORKERS, Config.JOB_WORKERS))
+def _canonicalize_job(job, item):
+    # moves a row saved under a redirect link to its target URL; when that
+    # URL already has a row, the fresh copy is folded into it and removed
+    it = db.session.get(CollectionItem, item.ref_id)
+    if it is None or not is_redirector(it.url):
+        return None
+    target = resolve(it.url)
+    if not target:
+        raise ValueError('redirect not resolved')
+    url = strip_tracking(target)
+    store_resolved({it.url: url})
+    other = db.session.query(CollectionItem).filter(CollectionItem.url == url).first()
+    if other is None:
+        it.url = url
+        return {'url': url}
+    for k in FIELDS:
+        if not getattr(other, k) and getattr(it, k):
+            setattr(other, k, getattr(it, k))
+    if db.session.query(CollectionDetail.id).filter(CollectionDetail.item_id == it.id).first() is not None:
+        return {'url': url, 'duplicate_of': other.id}
+    db.session.commit()
+    purge_items([it.id])
+    return {'url': url, 'merged_into': other.id}
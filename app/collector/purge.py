@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+from ..extensions import db
+from ..models import CollectionItem, CollectionDetail
+from ..bulk import chunked, delete_in
+from .simhash import release_details
+from .blobstore import prune_orphans
+from .search import unindex_items
+from ..cache import count_cache
+
+def purge_items(ids):
+    # Deletes items with their details, simhash bands and any HTML blobs no
+    # longer referenced. Commits per chunk; returns per-table counts.
+    out = {'items': 0, 'details': 0, 'blobs': 0}
+    for part in chunked(ids):
+        det_ids = [d for (d,) in db.session.query(CollectionDetail.id).filter(CollectionDetail.item_id.in_(part))]
+        if det_ids:
+            # owns band cleanup and re-homes near-duplicates of these details
+            release_details(det_ids)
+            out['details'] += delete_in(CollectionDetail.id, det_ids)
+        unindex_items(part)
+        out['items'] += delete_in(CollectionItem.id, part)
+        db.session.commit()
+    count_cache.invalidate()
+    if out['details']:
+        out['blobs'] = prune_orphans()
+        db.session.commit()
+    return out
+
+def item_filter(keyword=None, source=None, older_than_days=None, deep_status=None):
+    # None when no criterion is given, so a blank form can never match everything
+    conds = []
+    if keyword:
+        conds.append(CollectionItem.keyword == keyword)
+    if source:
+        conds.append(CollectionItem.source == source)
+    if older_than_days is not None:
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=float(older_than_days))
+        conds.append(CollectionItem.created_at < cutoff)
+    if deep_status is not None:
+        conds.append(CollectionItem.deep_status == bool(deep_status))
+    if not conds:
+        return None
+    return db.session.query(CollectionItem.id).filter(*conds)
+
+def purge_by_filter(dry_run: bool = False, **filters):
+    q = item_filter(**filters)
+    if q is None:
+        raise ValueError('at least one filter is required')
+    if dry_run:
+        return {'matched': q.count()}
+    ids = [i for (i,) in q.order_by(CollectionItem.id)]
+    res = purge_items(ids)
+    res['matched'] = len(ids)
+    return res
@@ -0,0 +1,125 @@
+import json
+import threading
+from ..cache import VersionStamp
+from ..extensions import db
+from ..models import Crawler, CrawlerSource
+
+def _loads(raw, kind):
+    if not raw:
+        return kind()
+    try:
+        val = json.loads(raw)
+    except Exception:
+        return kind()
+    return val if isinstance(val, kind) else kind()
+
+class CompiledCrawler:
+    def __init__(self, r: Crawler):
+        self.id = r.id
+        self.name = r.name
+        self.code = r.code
+        self.enabled = bool(r.enabled)
+        self.entry = r.entry
+        self.class_path = r.class_path
+        self.base_url = r.base_url
+        self.config = _loads(r.config_json, dict)
+        self.headers = _loads(r.headers_json, dict) or None
+        self.params = _loads(r.params_json, dict)
+        self.dynamic_keys = _loads(r.dynamic_keys, list)
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _build_target(self):
+        from .service import _resolve_callable, _resolve_class
+        if self.class_path:
+            Cls = _resolve_class(self.class_path)
+            try:
+                inst = Cls(base_url=self.base_url, headers=self.headers)
+            except Exception:
+                inst = Cls()
+            if hasattr(inst, 'run'):
+                return inst.run
+            if hasattr(inst, 'fetch'):
+                return inst.fetch
+            raise ValueError('crawler class missing run/fetch')
+        return _resolve_callable(self.entry)
+
+    def target(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._build_target()
+        return self._target
+
+    def keyword_params(self, keyword: str, limit: int):
+        if not self.class_path:
+            return {'keyword': keyword, 'limit': limit}
+        from .service import KEYWORD_KEYS
+        keys = [k for k in self.dynamic_keys if str(k).lower() in KEYWORD_KEYS]
+        keys = keys or [k for k in self.params if k.lower() in KEYWORD_KEYS] or ['keyword']
+        p = {k: keyword for k in keys}
+        p['limit'] = limit
+        return p
+
+    def run(self, params: dict | None = None):
+        # params_json is the default, config_json overrides it, runtime params win
+        merged = dict(self.params) if self.class_path else {}
+        merged.update(self.config)
+        if isinstance(params, dict):
+            merged.update(params)
+        fn = self.target()
+        if self.class_path:
+            return fn(merged)
+        return fn(**{k: v for k, v in merged.items() if v is not None})
+
+# Crawler/source writes bump the 'crawlers' CacheVersion so every worker reloads.
+class CrawlerRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap = None
+        self._stamp = VersionStamp('crawlers')
+
+    def _load(self):
+        by_id = {r.id: CompiledCrawler(r) for r in db.session.query(Crawler).all()}
+        by_code = {c.code: c for c in by_id.values() if c.enabled and c.code}
+        by_source = {}
+        rows = db.session.query(CrawlerSource).filter_by(enabled=True).order_by(CrawlerSource.id).all()
+        for m in rows:
+            c = by_id.get(m.crawler_id)
+            if c and c.enabled:
+                by_source.setdefault(m.source, []).append(c)
+        return by_id, by_code, by_source
+
+    def _snapshot(self):
+        if self._stamp.changed():
+            self._drop()
+        snap = self._snap
+        if snap is None:
+            with self._lock:
+                snap = self._snap
+                if snap is None:
+                    snap = self._snap = self._load()
+        return snap
+
+    def _drop(self):
+        with self._lock:
+            self._snap = None
+
+    def invalidate(self):
+        self._drop()
+        self._stamp.bump()
+
+    def get_by_id(self, id_: int):
+        return self._snapshot()[0].get(int(id_))
+
+    def get_by_code(self, code: str):
+        return self._snapshot()[1].get(code)
+
+    def get_by_source(self, source: str):
+        found = self._snapshot()[2].get(source)
+        return found[0] if found else None
+
+    def sources(self):
+        return [(s, c) for s, cs in self._snapshot()[2].items() for c in cs]
+
+crawler_registry = CrawlerRegistry()
@@ -1,26 +1,89 @@
-from flask import request, jsonify
+import json
+from flask import request, jsonify, Response, stream_with_context
 from . import bp
-from .service import fetch_baidu_news, fetch_xinhua_sichuan
 
 @bp.get('/collect')
 def collect():
     q = request.args.get('q') or request.args.get('keyword') or ''
     limit = int(request.args.get('limit') or 20)
     pn = int(request.args.get('pn') or 0)
+    workers = int(request.args.get('workers') or 0) or None
     if not q:
         return jsonify({'error': 'keyword required'}), 400
+    from .service import fetch_baidu_news
     try:
-        items = fetch_baidu_news(q, limit=limit, pn=pn)
+        items = fetch_baidu_news(q, limit=limit, pn=pn, workers=workers)
         return jsonify({'keyword': q, 'pn': pn, 'count': len(items), 'items': items})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.get('/collect/stream')
+def collect_stream():
+    q = request.args.get('q') or request.args.get('keyword') or ''
+    source = request.args.get('source') or 'baidu'
+    limit = int(request.args.get('limit') or 20)
+    pn = int(request.args.get('pn') or 0)
+    workers = int(request.args.get('workers') or 0) or None
+    sse = request.args.get('format') == 'sse' or 'text/event-stream' in (request.headers.get('Accept') or '')
+    if source == 'baidu' and not q:
+        return jsonify({'error': 'keyword required'}), 400
+
+    from .service import fetch_xinhua_sichuan, iter_baidu_news
+
+    def batches():
+        if source == 'xinhua':
+            yield fetch_xinhua_sichuan(keyword=(q or None), limit=limit)
+        else:
+            yield from iter_baidu_news(q, limit=limit, pn=pn, workers=workers)
+
+    def encode(rec):
+        line = json.dumps(rec, ensure_ascii=False)
+        return f'event: {rec["type"]}\ndata: {line}\n\n' if sse else line + '\n'
+
+    def generate():
+        count = 0
+        pages = 0
+        try:
+            for batch in batches():
+                pages += 1
+                count += len(batch)
+                yield encode({'type': 'items', 'page': pages, 'items': batch})
+            yield encode({'type': 'done', 'keyword': q, 'source': source, 'count': count, 'pages': pages})
+        except Exception as e:
+            yield encode({'type': 'error', 'message': str(e), 'count': count, 'pages': pages})
+
+    mimetype = 'text/event-stream' if sse else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @bp.get('/collect/xinhua')
 def collect_xinhua():
     q = request.args.get('q') or request.args.get('keyword') or ''
     limit = int(request.args.get('limit') or 20)
+    from .service import fetch_xinhua_sichuan
     try:
         items = fetch_xinhua_sichuan(keyword=(q or None), limit=limit)
         return jsonify({'keyword': q, 'count': len(items), 'items': items})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@bp.route('/collect/all', methods=['GET', 'POST'])
+def collect_all():
+    save = request.args.get('save') in ('1', 'true')
+    if save and request.method != 'POST':
+        return jsonify({'error': 'save=1 requires POST'}), 405
+    q = request.args.get('q') or request.args.get('keyword') or ''
+    limit = int(request.args.get('limit') or 20)
+    timeout = float(request.args.get('timeout') or 15)
+    sources = request.args.getlist('source') or None
+    if not q:
+        return jsonify({'error': 'keyword required'}), 400
+    from .service import collect_all_sources
+    try:
+        items, report = collect_all_sources(q, limit=limit, timeout=timeout, sources=sources)
+        res = {'keyword': q, 'count': len(items), 'items': items, 'sources': report}
+        if save:
+            from .ingest import save_items
+            res.update(save_items(items, keyword=q))
+        return jsonify(res)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,181 @@
+import threading
+from urllib.parse import urlparse
+from ..cache import VersionStamp
+from ..extensions import db
+from ..models import CrawlRule
+
+def host_labels(value: str | None):
+    v = (value or '').strip().lower()
+    if not v:
+        return []
+    if '://' not in v:
+        v = '//' + v
+    host = urlparse(v).hostname or ''
+    return [p for p in host.split('.') if p][::-1]
+
+def xpath_error(expr: str | None):
+    if not expr or not str(expr).strip():
+        return None
+    from lxml import etree
+    try:
+        etree.XPath(expr)
+    except etree.XPathError as e:
+        return str(e) or 'invalid xpath'
+    return None
+
+# compiled expressions keyed by (rule id, updated_at, field); the expression
+# text is kept alongside so a stale key can never serve the wrong XPath
+_xpath_cache = {}
+
+def compiled_xpath(rule_id, updated_at, field: str, expr: str | None):
+    if not expr or not str(expr).strip():
+        return None, None
+    key = (rule_id, updated_at, field)
+    hit = _xpath_cache.get(key)
+    if hit is None or hit[0] != expr:
+        from lxml import etree
+        try:
+            hit = (expr, etree.XPath(expr), None)
+        except etree.XPathError as e:
+            hit = (expr, None, str(e) or 'invalid xpath')
+        _xpath_cache[key] = hit
+    return hit[1], hit[2]
+
+def rule_xpath_errors(r):
+    errs = {}
+    for field in ('title_xpath', 'content_xpath'):
+        _, err = compiled_xpath(r.id, r.updated_at, field, getattr(r, field))
+        if err:
+            errs[field] = err
+    return errs
+
+class IndexedRule:
+    def __init__(self, r: CrawlRule):
+        self.id = r.id
+        self.name = r.name
+        self.site = r.site
+        self.title_xpath = r.title_xpath
+        self.content_xpath = r.content_xpath
+        self.request_headers = r.request_headers
+        self.updated_at = r.updated_at
+        self.title_xp, _ = compiled_xpath(r.id, r.updated_at, 'title_xpath', r.title_xpath)
+        self.content_xp, _ = compiled_xpath(r.id, r.updated_at, 'content_xpath', r.content_xpath)
+
+class _Node:
+    __slots__ = ('children', 'rules')
+
+    def __init__(self):
+        self.children = {}
+        self.rules = []
+
+    def subtree(self, out):
+        out.extend(self.rules)
+        for ch in self.children.values():
+            ch.subtree(out)
+        return out
+
+# Reversed-label trie over CrawlRule.site plus a name map. Matching walks the
+# item's host from the TLD down, so cost is O(labels) with no DB round-trips.
+# Rule writes bump the 'rules' CacheVersion so every worker rebuilds.
+class RuleIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snap = None
+        self._stamp = VersionStamp('rules')
+
+    def _load(self):
+        rows = db.session.query(CrawlRule).filter_by(enabled=True).order_by(CrawlRule.id).all()
+        live = {(r.id, r.updated_at) for r in rows}
+        for key in [k for k in list(_xpath_cache) if (k[0], k[1]) not in live]:
+            _xpath_cache.pop(key, None)
+        return self._build(rows)
+
+    @staticmethod
+    def _build(rows):
+        root = _Node()
+        by_name = {}
+        for r in rows:
+            ir = IndexedRule(r)
+            if ir.name:
+                by_name.setdefault(ir.name, []).append(ir)
+            labels = host_labels(ir.site)
+            if not labels:
+                continue
+            node = root
+            for lb in labels:
+                node = node.children.setdefault(lb, _Node())
+            node.rules.append(ir)
+        return root, by_name
+
+    def _snapshot(self):
+        if self._stamp.changed():
+            self._drop()
+        snap = self._snap
+        if snap is None:
+            with self._lock:
+                snap = self._snap
+                if snap is None:
+                    snap = self._snap = self._load()
+        return snap
+
+    def _drop(self):
+        with self._lock:
+            self._snap = None
+
+    def invalidate(self):
+        self._drop()
+        self._stamp.bump()
+
+    def match(self, source: str | None, url: str | None):
+        root, by_name = self._snapshot()
+        rules = []
+        seen = set()
+
+        def add(rs):
+            for r in rs:
+                if r.id not in seen:
+                    seen.add(r.id)
+                    rules.append(r)
+
+        # 1. Match by source name (Highest Priority)
+        if source:
+            add(by_name.get(source, []))
+
+        # 2. Match by site domain: rules on the host itself, then on its parent
+        # domains. Rules on hosts below it never apply (baidu.com/link must not
+        # pick up baijiahao.baidu.com), except the www. alias of a bare host.
+        labels = host_labels(url)
+        path = []
+        node = root
+        for lb in labels:
+            node = node.children.get(lb)
+            if node is None:
+                break
+            path.append(node)
+        by_site = []
+        ancestors = path
+        if path and len(path) == len(labels):
+            by_site.extend(path[-1].rules)
+            www = path[-1].children.get('www')
+            if www is not None and labels[-1] != 'www':
+                by_site.extend(www.rules)
+            ancestors = path[:-1]
+        for n in reversed(ancestors):
+            by_site.extend(n.rules)
+
+        # 3. Nothing for the host or its parents: fall back to sibling hosts
+        # under a parent of three or more labels (a.news.example.com ->
+        # b.news.example.com), never under a bare registrable domain and
+        # never below the host itself
+        if not by_site:
+            for depth in range(min(len(labels) - 1, len(path)), 2, -1):
+                skip = path[depth] if depth < len(path) else None
+                for ch in path[depth - 1].children.values():
+                    if ch is not skip:
+                        ch.subtree(by_site)
+                if by_site:
+                    break
+        add(by_site)
+        return rules
+
+rule_index = RuleIndex()
@@ -0,0 +1,135 @@
+import html
+import re
+from sqlalchemy import text, func
+from ..extensions import db
+from ..models import CollectionItem, CollectionDetail
+from ..bulk import chunked
+from ..cache import count_cache
+
+# FTS5's unicode61 tokenizer treats a run of Han characters as one token, so
+# text is pre-split here: CJK runs become overlapping bigrams (plus the last
+# character as a unigram, for one-character prefix queries), other words pass
+# through. The index stores this token stream; snippets come from the
+# original text.
+FTS_TABLE = 'item_fts'
+_HAN = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_RUN = re.compile(f'[{_HAN}]+|[^\\W_{_HAN}]+', re.UNICODE)
+_CJK = re.compile(f'[{_HAN}]')
+_available = None
+
+def _grams(run: str):
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+def tokenize(value: str | None) -> str:
+    out = []
+    for run in _RUN.findall((value or '').lower()):
+        out.extend(_grams(run) if _CJK.match(run) else [run])
+    return ' '.join(out)
+
+def match_query(q: str | None):
+    # every term must match: CJK runs as bigram phrases, single characters
+    # and latin words as prefixes
+    terms = []
+    for run in _RUN.findall((q or '').lower()):
+        if _CJK.match(run) and len(run) > 1:
+            terms.append('"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        else:
+            terms.append('"' + run + '"*')
+    return ' '.join(terms) or None
+
+def available() -> bool:
+    global _available
+    if _available is None:
+        try:
+            db.session.execute(text(f'SELECT rowid FROM {FTS_TABLE} LIMIT 0'))
+            _available = True
+        except Exception:
+            db.session.rollback()
+            _available = False
+    return _available
+
+def _latest_text(ids):
+    latest = (db.session.query(func.max(CollectionDetail.id))
+              .filter(CollectionDetail.item_id.in_(ids)).group_by(CollectionDetail.item_id))
+    rows = db.session.query(CollectionDetail.item_id, CollectionDetail.content_text).filter(CollectionDetail.id.in_(latest))
+    return dict(rows)
+
+def index_items(ids):
+    # (re)writes the FTS rows for these items; caller commits
+    if not available():
+        return 0
+    n = 0
+    for part in chunked(ids):
+        unindex_items(part)
+        bodies = _latest_text(part)
+        rows = [{'id': i, 'title': tokenize(t), 'source': tokenize(s), 'keyword': tokenize(k), 'body': tokenize(bodies.get(i))}
+                for i, t, s, k in db.session.query(CollectionItem.id, CollectionItem.title, CollectionItem.source, CollectionItem.keyword)
+                .filter(CollectionItem.id.in_(part))]
+        if rows:
+            db.session.execute(text(f'INSERT INTO {FTS_TABLE}(rowid, title, source, keyword, body) VALUES (:id, :title, :source, :keyword, :body)'), rows)
+            n += len(rows)
+    return n
+
+def unindex_items(ids):
+    if not available():
+        return
+    for part in chunked(ids):
+        db.session.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({",".join(str(int(i)) for i in part)})'))
+
+def search_items(q: str, limit: int = 10, offset: int = 0):
+    # returns (total, [item ids best first]); title hits weigh most
+    m = match_query(q)
+    if not m:
+        return 0, []
+    total = count_cache.get_or_set(('fts', m), lambda: db.session.execute(
+        text(f'SELECT count(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :m'), {'m': m}).scalar())
+    ids = [r[0] for r in db.session.execute(text(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :m '
+        f'ORDER BY bm25({FTS_TABLE}, 10.0, 3.0, 3.0, 1.0) LIMIT :limit OFFSET :offset'),
+        {'m': m, 'limit': limit, 'offset': offset})]
+    return total, ids
+
+def highlight(value: str | None, q: str, width: int = 0):
+    # HTML-escaped text with query terms in <mark>; with width, only a
+    # window around the first hit is returned
+    if not value:
+        return None
+    terms = sorted({t for t in _RUN.findall((q or '').lower())}, key=len, reverse=True)
+    if not terms:
+        return html.escape(value[:width] if width else value)
+    pat = re.compile('|'.join(re.escape(t) for t in terms), re.I)
+    if width:
+        hit = pat.search(value)
+        if hit is None:
+            return None
+        start = max(0, hit.start() - width // 3)
+        end = min(len(value), start + width)
+        value = ('…' if start else '') + value[start:end] + ('…' if end < len(value) else '')
+    out = []
+    pos = 0
+    for mt in pat.finditer(value):
+        out.append(html.escape(value[pos:mt.start()]))
+        out.append('<mark>' + html.escape(mt.group(0)) + '</mark>')
+        pos = mt.end()
+    out.append(html.escape(value[pos:]))
+    return ''.join(out)
+
+def rebuild(batch: int = 2000):
+    if not available():
+        return 0
+    db.session.execute(text(f'DELETE FROM {FTS_TABLE}'))
+    n = 0
+    last = 0
+    while True:
+        ids = [i for (i,) in db.session.query(CollectionItem.id).filter(CollectionItem.id > last)
+               .order_by(CollectionItem.id).limit(batch)]
+        if not ids:
+            break
+        n += index_items(ids)
+        last = ids[-1]
+        db.session.commit()
+    db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+    db.session.commit()
+    return n
@@ -1,14 +1,12 @@
 import os
 from urllib.parse import quote
-import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import re
-import re
 import importlib
-import json
-from ..extensions import db
-from ..models import Crawler, CrawlerSource
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from . import client
 from urllib.parse import urlparse, parse_qs, urlencode
 
 DEFAULT_HEADERS = {
@@ -27,12 +25,13 @@ DEFAULT_HEADERS = {
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/142.0.0.0 Safari/537.36 Edg/142.0.0.0'
 }
 
-def _headers_with_cookie():
-    headers = DEFAULT_HEADERS.copy()
-    cookie = os.getenv('BAIDU_COOKIE')
-    if cookie:
-        headers['cookie'] = cookie
-    return headers
+KEYWORD_KEYS = {'q','word','kw','keyword','query','search'}
+PAGE_KEYS = {'pn','page','p','offset'}
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS') or 64)
+
+def _default_headers():
+    # BAIDU_COOKIE lives in the shared client's cookie jar, scoped to baidu.com
+    return DEFAULT_HEADERS.copy()
 
 def _extract_source(container: BeautifulSoup) -> str:
     # try multiple specific selectors
@@ -52,49 +51,86 @@ def _extract_source(container: BeautifulSoup) -> str:
         return m.group(1).replace('·', '').strip()
     return ''
 
-def fetch_baidu_news(keyword: str, limit: int = 20, pn: int = 0):
-    base = 'https://www.baidu.com/s'
-    items = []
+BAIDU_PAGE_SIZE = 10
+BAIDU_MAX_PAGES = 10
+BAIDU_PAGE_WORKERS = int(os.getenv('BAIDU_PAGE_WORKERS') or 4)
+
+def _fetch_baidu_page(keyword: str, offset: int, caller=None):
+    params = f'rtt=1&bsst=1&cl=2&tn=news&rsv_dl=ns_pc&word={quote(keyword)}&pn={offset}'
+    url = f'https://www.baidu.com/s?{params}'
+    resp = client.get(url, headers=_default_headers(), timeout=10, caller=caller)
+    resp.raise_for_status()
+    soup = BeautifulSoup(resp.text, 'lxml')
+    candidates = soup.select('div.result, div.news, div.new-pmd, div.result-op, div.c-container, article')
+    page = []
+    for c in candidates:
+        a = c.find('a', href=True)
+        if not a:
+            continue
+        img = c.find('img')
+        cover = None
+        if img:
+            cover = img.get('src') or img.get('data-src') or img.get('data-thumb')
+        page.append({
+            'title': a.get_text(strip=True),
+            'cover': cover,
+            'url': a['href'],
+            'source': _extract_source(c),
+        })
+    return page
+
+def iter_baidu_news(keyword: str, limit: int = 20, pn: int = 0, workers: int | None = None):
+    # yields each page's new items as soon as that page is parsed
+    count = 0
     seen = set()
     offset = max(0, int(pn or 0))
+    workers = max(1, int(workers or BAIDU_PAGE_WORKERS))
     pages = 0
-    while len(items) < limit and pages < 10:
-        params = f'rtt=1&bsst=1&cl=2&tn=news&rsv_dl=ns_pc&word={quote(keyword)}&pn={offset}'
-        url = f'{base}?{params}'
-        resp = requests.get(url, headers=_headers_with_cookie(), timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, 'lxml')
-        candidates = soup.select('div.result, div.news, div.new-pmd, div.result-op, div.c-container, article')
-        for c in candidates:
-            a = c.find('a', href=True)
-            if not a:
-                continue
-            title = a.get_text(strip=True)
-            href = a['href']
-            if href in seen:
-                continue
-            img = c.find('img')
-            cover = None
-            if img:
-                cover = img.get('src') or img.get('data-src') or img.get('data-thumb')
-            source = _extract_source(c)
-            items.append({
-                'title': title,
-                'cover': cover,
-                'url': href,
-                'source': source,
-            })
-            seen.add(href)
-            if len(items) >= limit:
+    # one scheduler identity per call so a wide fan-out queues fairly against other callers
+    caller = object()
+    # Pages are requested in waves of up to `workers` concurrent fetches and
+    # merged back strictly in page order, so output matches the serial walk.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while count < limit and pages < BAIDU_MAX_PAGES:
+            need = -(-(limit - count) // BAIDU_PAGE_SIZE)
+            wave = min(workers, need, BAIDU_MAX_PAGES - pages)
+            offsets = [offset + i * BAIDU_PAGE_SIZE for i in range(wave)]
+            futures = [pool.submit(_fetch_baidu_page, keyword, o, caller) for o in offsets]
+            exhausted = False
+            try:
+                for fut in futures:
+                    batch = []
+                    for it in fut.result():
+                        if it['url'] in seen:
+                            continue
+                        batch.append(it)
+                        seen.add(it['url'])
+                        if count + len(batch) >= limit:
+                            break
+                    count += len(batch)
+                    if batch:
+                        yield batch
+                    if not batch or count >= limit:
+                        exhausted = True
+                        break
+            finally:
+                for fut in futures:
+                    fut.cancel()
+            offset += wave * BAIDU_PAGE_SIZE
+            pages += wave
+            if exhausted:
                 break
-        offset += 10
-        pages += 1
+
+def fetch_baidu_news(keyword: str, limit: int = 20, pn: int = 0, workers: int | None = None):
+    items = []
+    for batch in iter_baidu_news(keyword, limit=limit, pn=pn, workers=workers):
+        items.extend(batch)
     return items
 
 def fetch_xinhua_sichuan(keyword: str | None = None, limit: int = 20):
     base = 'https://sc.news.cn/'
     url = urljoin(base, 'scyw.htm')
-    resp = requests.get(url, headers=_headers_with_cookie(), timeout=10)
+    resp = client.get(url, headers=_default_headers(), timeout=10)
     resp.raise_for_status()
     soup = BeautifulSoup(resp.text, 'lxml')
     items = []
@@ -212,8 +248,6 @@ def analyze_crawler_from_request(source_url: str, headers_raw: str):
     code = (u.netloc.replace('.', '_') + '_' + (u.path.strip('/').split('/')[0] or 'root')).lower()
     # detect dynamic keys
     dynamic = []
-    KEYWORD_KEYS = {'q','word','kw','keyword','query','search'}
-    PAGE_KEYS = {'pn','page','p','offset'}
     for k in params.keys():
         lk = k.lower()
         if lk in KEYWORD_KEYS or lk in PAGE_KEYS or lk in {'limit'}:
@@ -268,67 +302,75 @@ class GenericListCrawler:
         p = params or {}
         url = self._build_url(p)
         hdrs = dict(self.headers)
-        resp = requests.get(url, headers=hdrs, timeout=15)
+        resp = client.get(url, headers=hdrs, timeout=15)
         resp.raise_for_status()
         soup = BeautifulSoup(resp.text, 'lxml')
         items = self._extract_items(soup, limit=int(p.get('limit') or 20))
         return items
 
 def run_crawler_by_code(code: str, params: dict):
-    r = db.session.query(Crawler).filter_by(code=code, enabled=True).first()
-    if not r:
+    from .registry import crawler_registry
+    c = crawler_registry.get_by_code(code)
+    if not c:
         raise ValueError('crawler not found or disabled')
-    cfg = None
-    try:
-        cfg = json.loads(r.config_json) if r.config_json else None
-    except Exception:
-        cfg = None
-    hdr = None
-    prm = None
-    try:
-        hdr = json.loads(r.headers_json) if r.headers_json else None
-    except Exception:
-        hdr = None
-    try:
-        prm = json.loads(r.params_json) if r.params_json else None
-    except Exception:
-        prm = None
-    merged = {}
-    if isinstance(cfg, dict):
-        merged.update(cfg)
-    if isinstance(params, dict):
-        merged.update(params)
-    if r.class_path:
-        return run_crawler_by_class(r.class_path, r.base_url, hdr, merged if merged else prm)
-    return run_crawler_by_entry(r.entry, merged)
+    return c.run(params)
 
 def run_crawler_by_source(source: str, params: dict):
-    m = db.session.query(CrawlerSource).filter_by(source=source, enabled=True).first()
-    if not m:
+    from .registry import crawler_registry
+    c = crawler_registry.get_by_source(source)
+    if not c:
         raise ValueError('no crawler mapped for source')
-    r = db.session.get(Crawler, m.crawler_id)
-    if not r or not r.enabled:
-        raise ValueError('mapped crawler not available')
-    cfg = None
-    try:
-        cfg = json.loads(r.config_json) if r.config_json else None
-    except Exception:
-        cfg = None
-    hdr = None
-    prm = None
-    try:
-        hdr = json.loads(r.headers_json) if r.headers_json else None
-    except Exception:
-        hdr = None
+    return c.run(params)
+
+def _run_source(source: str, crawler, params: dict):
+    t0 = time.monotonic()
+    items = crawler.run(params) or []
+    out = []
+    for it in items:
+        if isinstance(it, dict) and it.get('url'):
+            it = dict(it)
+            it.setdefault('source', source)
+            it['crawler_source'] = source
+            out.append(it)
+    return out, int((time.monotonic() - t0) * 1000)
+
+def collect_all_sources(keyword: str, limit: int = 20, timeout: float = 15, sources: list | None = None):
+    from .registry import crawler_registry
+    targets = [(s, c) for s, c in crawler_registry.sources() if not sources or s in sources]
+    if not targets:
+        return [], []
+    # a pool per call, one thread per source, so every source starts at once
+    # and the deadline is the slowest site, not the queue; sources past
+    # FANOUT_WORKERS that have not started by then are cancelled, and slow
+    # ones finish on this call's threads without holding up the next call
+    pool = ThreadPoolExecutor(max_workers=min(len(targets), FANOUT_WORKERS), thread_name_prefix='fanout')
+    futures = {}
     try:
-        prm = json.loads(r.params_json) if r.params_json else None
-    except Exception:
-        prm = None
-    merged = {}
-    if isinstance(cfg, dict):
-        merged.update(cfg)
-    if isinstance(params, dict):
-        merged.update(params)
-    if r.class_path:
-        return run_crawler_by_class(r.class_path, r.base_url, hdr, merged if merged else prm)
-    return run_crawler_by_entry(r.entry, merged)
+        for source, crawler in targets:
+            futures[pool.submit(_run_source, source, crawler, crawler.keyword_params(keyword, limit))] = (source, crawler)
+        done, _ = wait(futures, timeout=timeout)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    items = []
+    seen = set()
+    report = []
+    # merge in mapping order so results are stable across calls
+    for fut, (source, crawler) in futures.items():
+        row = {'source': source, 'crawler': crawler.code, 'status': 'ok', 'count': 0}
+        if fut not in done:
+            row['status'] = 'timeout'
+            if fut.cancelled():
+                row['error'] = 'not started before the deadline'
+        elif fut.exception() is not None:
+            row['status'] = 'error'
+            row['error'] = str(fut.exception())
+        else:
+            got, row['elapsed_ms'] = fut.result()
+            for it in got:
+                if it['url'] in seen:
+                    continue
+                seen.add(it['url'])
+                items.append(it)
+                row['count'] += 1
+        report.append(row)
+    return items, report
@@ -0,0 +1,123 @@
+import hashlib
+import re
+from collections import Counter
+from ..extensions import db
+from ..models import CollectionDetail, SimhashBand
+from ..config import Config
+
+# 64-bit fingerprint split into BANDS exact-match bands: any two prints within
+# BANDS - 1 bits share at least one band, so SIMHASH_DISTANCE is capped there
+BANDS = 8
+BAND_BITS = 8
+SHINGLE = 3
+MIN_TEXT = 50
+_MASK = (1 << 64) - 1
+_STRIP = re.compile(r'[\s\W_]+', re.UNICODE)
+
+def _to_signed(v: int) -> int:
+    # SQLite INTEGER is signed 64-bit
+    return v - (1 << 64) if v >= (1 << 63) else v
+
+def _to_unsigned(v: int) -> int:
+    return v & _MASK
+
+def simhash(text: str | None):
+    s = _STRIP.sub('', (text or '').lower())
+    if len(s) < MIN_TEXT:
+        return None
+    shingles = Counter(s[i:i + SHINGLE] for i in range(len(s) - SHINGLE + 1))
+    digests = [(hashlib.blake2b(sh.encode('utf-8'), digest_size=8).digest(), n) for sh, n in shingles.items()]
+    total = sum(shingles.values())
+    # count set bits per byte position instead of per bit: 8 x 256 buckets
+    v = 0
+    for j in range(8):
+        per_byte = Counter()
+        for d, n in digests:
+            per_byte[d[j]] += n
+        for bit in range(8):
+            ones = sum(n for val, n in per_byte.items() if (val >> bit) & 1)
+            if ones * 2 > total:
+                v |= 1 << ((7 - j) * 8 + bit)
+    return _to_signed(v)
+
+def bands(fp: int):
+    u = _to_unsigned(fp)
+    return [(i, (u >> (i * BAND_BITS)) & ((1 << BAND_BITS) - 1)) for i in range(BANDS)]
+
+def max_distance() -> int:
+    # a larger threshold would silently miss pairs that share no band
+    return max(0, min(Config.SIMHASH_DISTANCE, BANDS - 1))
+
+def distance(a: int, b: int) -> int:
+    return bin(_to_unsigned(a) ^ _to_unsigned(b)).count('1')
+
+def fingerprint_detail(det: CollectionDetail):
+    # Computes the fingerprint, refreshes the band rows and links the detail
+    # to the canonical copy of its closest near-duplicate. Caller commits.
+    fp = simhash(det.content_text)
+    if det.id is None:
+        db.session.flush()
+    if fp == det.simhash and (fp is None or det.canonical_id is not None or _has_bands(det.id)):
+        return det.canonical_id
+    db.session.query(SimhashBand).filter_by(detail_id=det.id).delete(synchronize_session=False)
+    det.simhash = fp
+    det.canonical_id = None
+    if fp is None:
+        return None
+    pairs = bands(fp)
+    cond = db.or_(*[db.and_(SimhashBand.band == b, SimhashBand.value == v) for b, v in pairs])
+    rows = (db.session.query(CollectionDetail.id, CollectionDetail.simhash, CollectionDetail.canonical_id)
+            .join(SimhashBand, SimhashBand.detail_id == CollectionDetail.id)
+            .filter(cond, CollectionDetail.id != det.id)
+            .distinct().all())
+    best = None
+    limit = max_distance()
+    for id_, other, canon in rows:
+        if other is None:
+            continue
+        d = distance(fp, other)
+        if d <= limit and (best is None or (d, id_) < best[:2]):
+            best = (d, id_, canon)
+    if best is not None:
+        det.canonical_id = best[2] or best[1]
+    db.session.add_all([SimhashBand(band=b, value=v, detail_id=det.id) for b, v in pairs])
+    return det.canonical_id
+
+def _has_bands(detail_id: int) -> bool:
+    return db.session.query(SimhashBand.id).filter_by(detail_id=detail_id).first() is not None
+
+def release_details(detail_ids):
+    # called before detail rows go away: drop their bands and promote the
+    # oldest surviving copy of each removed canonical article
+    ids = [int(i) for i in detail_ids]
+    if not ids:
+        return
+    db.session.query(SimhashBand).filter(SimhashBand.detail_id.in_(ids)).delete(synchronize_session=False)
+    copies = (db.session.query(CollectionDetail)
+              .filter(CollectionDetail.canonical_id.in_(ids), CollectionDetail.id.notin_(ids))
+              .order_by(CollectionDetail.id).all())
+    groups = {}
+    for d in copies:
+        groups.setdefault(d.canonical_id, []).append(d)
+    for group in groups.values():
+        head = group[0]
+        head.canonical_id = None
+        for d in group[1:]:
+            d.canonical_id = head.id
+
+def backfill(batch: int = 500):
+    # fingerprints rows written before the simhash column existed, oldest
+    # first so the earliest copy of a story ends up canonical
+    done = 0
+    last = 0
+    while True:
+        rows = (db.session.query(CollectionDetail)
+                .filter(CollectionDetail.simhash.is_(None), CollectionDetail.id > last)
+                .order_by(CollectionDetail.id).limit(batch).all())
+        if not rows:
+            return done
+        for det in rows:
+            fingerprint_detail(det)
+            last = det.id
+            done += 1
+        db.session.commit()
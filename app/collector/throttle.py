@@ -0,0 +1,154 @@
+import json
+import threading
+import time
+from collections import deque, OrderedDict
+from email.utils import parsedate_to_datetime
+import requests
+from ..config import Config
+
+class QueueTimeout(requests.exceptions.Timeout):
+    pass
+
+# Token bucket plus concurrency cap for one host. Waiters are queued per
+# caller and served round-robin, so one caller fanning out many requests
+# cannot starve another caller's single fetch. The rate halves on 429/503
+# and creeps back up on success, settling near what the host tolerates.
+class HostLimiter:
+    def __init__(self, rate: float, burst: float, concurrency: int):
+        self.max_rate = max(0.01, float(rate))
+        self.rate = self.max_rate
+        self.burst = max(1.0, float(burst))
+        self.concurrency = max(1, int(concurrency))
+        self.tokens = self.burst
+        self.stamp = time.monotonic()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.cond = threading.Condition()
+        self.queues = OrderedDict()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def _head(self):
+        for caller, q in self.queues.items():
+            if q:
+                return caller, q[0]
+        return None, None
+
+    def acquire(self, caller, timeout: float | None = None):
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            self.queues.setdefault(caller, deque()).append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    head_caller, head = self._head()
+                    wait = None
+                    if head is ticket and self.in_flight < self.concurrency:
+                        if now < self.paused_until:
+                            wait = self.paused_until - now
+                        elif self.tokens >= 1:
+                            self.tokens -= 1
+                            self.in_flight += 1
+                            q = self.queues.pop(head_caller)
+                            q.popleft()
+                            if q:
+                                # rotate this caller to the back of the line
+                                self.queues[head_caller] = q
+                            self.cond.notify_all()
+                            return
+                        else:
+                            wait = (1 - self.tokens) / self.rate
+                    if deadline is not None:
+                        left = deadline - now
+                        if left <= 0:
+                            raise QueueTimeout('rate limiter queue timeout')
+                        wait = left if wait is None else min(wait, left)
+                    self.cond.wait(wait)
+            except BaseException:
+                q = self.queues.get(caller)
+                if q is not None and ticket in q:
+                    q.remove(ticket)
+                    if not q:
+                        del self.queues[caller]
+                self.cond.notify_all()
+                raise
+
+    def release(self, status: int | None = None, retry_after: float | None = None):
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            if status in (429, 503):
+                self.rate = max(self.max_rate / 32, self.rate / 2)
+                if retry_after:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            elif status is not None and status < 400:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+            self.cond.notify_all()
+
+def _parse_retry_after(value: str | None):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+class HostScheduler:
+    def __init__(self, rate: float, burst: float, concurrency: int, overrides: dict | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.overrides = overrides or {}
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def _limits_for(self, host: str):
+        limits = {'rate': self.rate, 'burst': self.burst, 'concurrency': self.concurrency}
+        best = ''
+        for suffix, cfg in self.overrides.items():
+            if (host == suffix or host.endswith('.' + suffix)) and len(suffix) > len(best):
+                best = suffix
+        if best and isinstance(self.overrides[best], dict):
+            limits.update({k: v for k, v in self.overrides[best].items() if k in limits})
+        return limits
+
+    def limiter(self, host: str) -> HostLimiter:
+        host = (host or '').lower()
+        lim = self.limiters.get(host)
+        if lim is None:
+            with self.lock:
+                lim = self.limiters.get(host)
+                if lim is None:
+                    lim = HostLimiter(**self._limits_for(host))
+                    self.limiters[host] = lim
+        return lim
+
+    def acquire(self, host: str, caller, timeout: float | None = None) -> HostLimiter:
+        lim = self.limiter(host)
+        lim.acquire(caller, timeout)
+        return lim
+
+    def release(self, lim: HostLimiter, resp=None):
+        if resp is None:
+            lim.release()
+            return
+        lim.release(resp.status_code, _parse_retry_after(resp.headers.get('Retry-After')))
+
+def _load_overrides():
+    raw = Config.HTTP_HOST_LIMITS
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+        return {k.lower(): v for k, v in data.items()} if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+scheduler = HostScheduler(Config.HTTP_HOST_RATE, Config.HTTP_HOST_BURST, Config.HTTP_HOST_CONCURRENCY, _load_overrides())
@@ -5,7 +5,65 @@ from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / '.env' / '.env')
 
+def _sqlite_engine_options(uri: str):
+    if not uri.startswith('sqlite'):
+        return {'pool_pre_ping': True}
+    # busy_timeout is also set by pragma; the driver timeout covers the first BEGIN
+    opts = {'connect_args': {'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT') or 5000) / 1000}}
+    if ':memory:' not in uri and uri not in ('sqlite://', 'sqlite:///'):
+        opts['pool_size'] = int(os.getenv('SQLITE_POOL_SIZE') or 8)
+        opts['max_overflow'] = int(os.getenv('SQLITE_MAX_OVERFLOW') or 8)
+        opts['pool_timeout'] = 30
+    return opts
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f"sqlite:///{BASE_DIR / 'govinfo.db'}")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _sqlite_engine_options(SQLALCHEMY_DATABASE_URI)
+    # applied on every new SQLite connection, see app/sqlite_profile.py
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE') or -65536)
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE') or 268435456)
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE') or 'MEMORY'
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT') or 5000)
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS') or 32)
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE') or 16)
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES') or 1)
+    HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT') or 15)
+    HTTP_HOST_RATE = float(os.getenv('HTTP_HOST_RATE') or 5)
+    HTTP_HOST_BURST = float(os.getenv('HTTP_HOST_BURST') or 5)
+    HTTP_HOST_CONCURRENCY = int(os.getenv('HTTP_HOST_CONCURRENCY') or 4)
+    HTTP_HOST_LIMITS = os.getenv('HTTP_HOST_LIMITS')
+    HTTP_QUEUE_TIMEOUT = float(os.getenv('HTTP_QUEUE_TIMEOUT') or 60)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS') or 4)
+    # job-pool threads one deep_collect job holds; the rest serve other jobs
+    DEEP_COLLECT_CONCURRENCY = int(os.getenv('DEEP_COLLECT_CONCURRENCY') or 2)
+    SIMHASH_DISTANCE = int(os.getenv('SIMHASH_DISTANCE') or 5)
+    CANONICAL_TTL = int(os.getenv('CANONICAL_TTL') or 7 * 86400)
+    CANONICAL_WORKERS = int(os.getenv('CANONICAL_WORKERS') or 8)
+    # longest a request waits on redirect resolution before moving on
+    CANONICAL_RESOLVE_TIMEOUT = float(os.getenv('CANONICAL_RESOLVE_TIMEOUT') or 5)
+    AI_CONNECT_TIMEOUT = float(os.getenv('AI_CONNECT_TIMEOUT') or 10)
+    # max silence between streamed chunks, not a cap on the whole completion
+    AI_READ_TIMEOUT = float(os.getenv('AI_READ_TIMEOUT') or 60)
+    # identical engine + messages + params are answered from cache; 0 entries
+    # disables the in-memory tier, AI_CACHE_PERSIST=0 the ai_response_cache table
+    AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE') or 256)
+    AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL') or 86400)
+    AI_CACHE_PERSIST = (os.getenv('AI_CACHE_PERSIST') or '1') not in ('0', 'false', 'no')
+    # prompt budget for engines without their own context_tokens / output_reserve
+    AI_CONTEXT_TOKENS = int(os.getenv('AI_CONTEXT_TOKENS') or 8192)
+    AI_OUTPUT_RESERVE = int(os.getenv('AI_OUTPUT_RESERVE') or 1024)
+    # longest article body sent to a model; longer ones keep head and tail
+    AI_ARTICLE_TOKENS = int(os.getenv('AI_ARTICLE_TOKENS') or 800)
+    # engine pool: concurrent requests per engine (unless set on the engine),
+    # extra engines tried after a 429/5xx, and how long to wait for a free slot
+    AI_ENGINE_CONCURRENCY = int(os.getenv('AI_ENGINE_CONCURRENCY') or 4)
+    AI_POOL_RETRIES = int(os.getenv('AI_POOL_RETRIES') or 2)
+    AI_POOL_WAIT = float(os.getenv('AI_POOL_WAIT') or 60)
+    # how many batches of one ai_clean job call the engine at the same time
+    AI_CLEAN_CONCURRENCY = int(os.getenv('AI_CLEAN_CONCURRENCY') or 2)
+    COUNT_CACHE_TTL = float(os.getenv('COUNT_CACHE_TTL') or 30)
+    CACHE_VERSION_INTERVAL = float(os.getenv('CACHE_VERSION_INTERVAL') or 5)
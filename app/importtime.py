@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PROBE = 'from app import create_app; create_app()'
+
+def measure(probe: str = PROBE):
+    # runs the probe in a fresh interpreter under -X importtime; returns
+    # [(cumulative_us, self_us, module)] and the total for the top-level imports
+    env = dict(os.environ, PYTHONPATH=str(ROOT) + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', probe], cwd=str(ROOT), env=env,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'probe failed')
+    rows = []
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cum_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cum_us), int(self_us), name.strip()))
+        if depth == 0:
+            total += int(cum_us)
+    rows.sort(reverse=True)
+    return rows, total
@@ -0,0 +1,208 @@
+import importlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from .extensions import db
+from .models import Job, JobItem
+from .config import Config
+
+_handlers = {}
+_options = {}
+# modules that register handlers, imported on first use so the web app
+# does not pay for crawler/parser imports at startup
+HANDLER_MODULES = {
+    'deep_collect': 'app.collector.deep',
+    'ai_clean': 'app.ai.clean',
+    'canonicalize': 'app.collector.ingest',
+}
+
+def register(kind: str, finalize=None, concurrency=None):
+    # finalize(job) runs once after every item has finished and its return
+    # value becomes job.result; concurrency(job) caps how many items of one
+    # job run at the same time (default: one pool task per item)
+    def deco(fn):
+        _handlers[kind] = fn
+        _options[kind] = {'finalize': finalize, 'concurrency': concurrency}
+        return fn
+    return deco
+
+def get_handler(kind: str):
+    if kind not in _handlers and kind in HANDLER_MODULES:
+        importlib.import_module(HANDLER_MODULES[kind])
+    return _handlers.get(kind)
+
+def job_to_dict(job: Job, with_items: bool = False, limit: int = 50):
+    finished = (job.done or 0) + (job.failed or 0)
+    d = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'total': job.total,
+        'done': job.done,
+        'failed': job.failed,
+        'progress': round(finished * 100 / job.total, 1) if job.total else 100.0,
+        'cancel_requested': job.cancel_requested,
+        'result': json.loads(job.result) if job.result else None,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'updated_at': job.updated_at.isoformat() if job.updated_at else None,
+    }
+    if with_items:
+        rows = db.session.query(JobItem).filter(JobItem.job_id == job.id, JobItem.status != 'pending').order_by(JobItem.id.desc()).limit(limit).all()
+        d['items'] = [{'id': r.id, 'ref_id': r.ref_id, 'status': r.status, 'message': r.message, 'result': json.loads(r.result) if r.result else None} for r in rows]
+    return d
+
+# Runs jobs on an in-process thread pool. Item state lives in the database,
+# so progress survives restarts and any worker can cancel or resume a job;
+# each item is claimed with a conditional UPDATE so it never runs twice.
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self._pool = None
+        self._final = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['job_runner'] = self
+
+    def _executor(self):
+        pid = os.getpid()
+        if self._pool is None or self._pid != pid:
+            with self._lock:
+                if self._pool is None or self._pid != pid:
+                    self._pool = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix='job')
+                    # finalizers get their own threads so a reduce step never
+                    # queues behind another job's items
+                    self._final = ThreadPoolExecutor(max_workers=2, thread_name_prefix='job-final')
+                    self._pid = pid
+        return self._pool
+
+    def create(self, kind: str, refs: list, params: dict | None = None) -> Job:
+        if get_handler(kind) is None:
+            raise ValueError(f'unknown job kind: {kind}')
+        job = Job(kind=kind, status='pending', total=len(refs), done=0, failed=0, cancel_requested=False,
+                  params=json.dumps(params or {}, ensure_ascii=False))
+        db.session.add(job)
+        db.session.flush()
+        db.session.bulk_insert_mappings(JobItem, [{'job_id': job.id, 'ref_id': r, 'status': 'pending'} for r in refs])
+        db.session.commit()
+        self.start(job.id)
+        return job
+
+    def start(self, job_id: int):
+        pool = self._executor()
+        ids = [r[0] for r in db.session.query(JobItem.id).filter_by(job_id=job_id, status='pending').order_by(JobItem.id).all()]
+        db.session.query(Job).filter_by(id=job_id).update({'status': 'running'})
+        db.session.commit()
+        if not ids:
+            self._finish(job_id)
+            db.session.commit()
+            return
+        job = db.session.get(Job, job_id)
+        limit = (_options.get(job.kind) or {}).get('concurrency')
+        lanes = limit(job) if limit else None
+        if lanes:
+            for _ in range(min(int(lanes), len(ids))):
+                pool.submit(self._run_lane, job_id)
+            return
+        for item_id in ids:
+            pool.submit(self._run_item, job_id, item_id)
+
+    def _run_lane(self, job_id: int):
+        # one of a fixed number of workers pulling the job's items in order
+        while True:
+            with self.app.app_context():
+                row = db.session.query(JobItem.id).filter_by(job_id=job_id, status='pending').order_by(JobItem.id).first()
+            if row is None:
+                return
+            self._run_item(job_id, row[0])
+
+    def cancel(self, job_id: int):
+        db.session.query(Job).filter_by(id=job_id).update({'cancel_requested': True})
+        db.session.query(JobItem).filter_by(job_id=job_id, status='pending').update({'status': 'cancelled'})
+        self._finish(job_id)
+        db.session.commit()
+
+    def resumable(self, job_id: int) -> bool:
+        # only unfinished work is handed out again: a job whose items are all
+        # ok/error has already run (or is running) its finalize step, and a
+        # second pass would repeat its side effects such as another AI call.
+        # 'running' and 'pending' cover jobs left behind by a dead process.
+        job = db.session.get(Job, job_id)
+        if job is None or job.status not in ('pending', 'running', 'cancelled', 'error'):
+            return False
+        left = db.session.query(JobItem.id).filter(JobItem.job_id == job_id, JobItem.status.in_(['pending', 'running', 'cancelled'])).first()
+        return left is not None
+
+    def resume(self, job_id: int) -> bool:
+        # items left 'running' by a dead worker are handed out again
+        if not self.resumable(job_id):
+            return False
+        db.session.query(JobItem).filter(JobItem.job_id == job_id, JobItem.status.in_(['running', 'cancelled'])).update({'status': 'pending'}, synchronize_session=False)
+        db.session.query(Job).filter_by(id=job_id).update({'cancel_requested': False})
+        db.session.commit()
+        self.start(job_id)
+        return True
+
+    def _finish(self, job_id: int):
+        job = db.session.get(Job, job_id)
+        if job is None or job.status not in ('pending', 'running'):
+            return
+        busy = db.session.query(JobItem.id).filter(JobItem.job_id == job_id, JobItem.status.in_(['pending', 'running'])).first()
+        if busy is not None:
+            return
+        finalize = (_options.get(job.kind) or {}).get('finalize')
+        if job.cancel_requested or finalize is None:
+            job.status = 'cancelled' if job.cancel_requested else 'done'
+            return
+        # several items can finish at once; only the one that flips the status runs finalize
+        claimed = db.session.query(Job).filter(Job.id == job_id, Job.status.in_(['pending', 'running'])).update({'status': 'finalizing'}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            self._executor()
+            self._final.submit(self._finalize, job_id)
+
+    def _finalize(self, job_id: int):
+        with self.app.app_context():
+            job = db.session.get(Job, job_id)
+            try:
+                res = _options[job.kind]['finalize'](job)
+                status = 'done'
+            except Exception as e:
+                db.session.rollback()
+                res = {'error': str(e)[:1000]}
+                status = 'error'
+            db.session.query(Job).filter_by(id=job_id).update({'status': status, 'result': json.dumps(res, ensure_ascii=False) if res is not None else None})
+            db.session.commit()
+
+    def _run_item(self, job_id: int, item_id: int):
+        with self.app.app_context():
+            claimed = db.session.query(JobItem).filter_by(id=item_id, status='pending').update({'status': 'running'})
+            db.session.commit()
+            if not claimed:
+                return
+            job = db.session.get(Job, job_id)
+            item = db.session.get(JobItem, item_id)
+            handler = get_handler(job.kind)
+            try:
+                if job.cancel_requested:
+                    item.status = 'cancelled'
+                else:
+                    res = handler(job, item)
+                    item.status = 'ok'
+                    item.result = json.dumps(res, ensure_ascii=False) if res is not None else None
+                    db.session.query(Job).filter_by(id=job_id).update({'done': Job.done + 1})
+            except Exception as e:
+                db.session.rollback()
+                item = db.session.get(JobItem, item_id)
+                item.status = 'error'
+                item.message = str(e)[:1000]
+                db.session.query(Job).filter_by(id=job_id).update({'failed': Job.failed + 1})
+            db.session.commit()
+            db.session.expire_all()
+            self._finish(job_id)
+            db.session.commit()
+
+job_runner = JobRunner()
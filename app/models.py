@@ -24,6 +24,11 @@ class Setting(db.Model):
     app_name = db.Column(db.String(128), nullable=False, default='政企智能舆情分析报告生成')
     logo_path = db.Column(db.String(256))
 
+class CacheVersion(db.Model):
+    # bumped on writes so every worker drops its in-process snapshots
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 class CollectionItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(512), nullable=False)
@@ -33,16 +38,50 @@ class CollectionItem(db.Model):
     keyword = db.Column(db.String(128))
     deep_status = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # keyset pagination order for the warehouse list
+    __table_args__ = (db.Index('ix_collection_item_created_at_id', 'created_at', 'id'),)
+
+class UrlCanonical(db.Model):
+    # redirector link (e.g. baidu.com/link?url=...) -> resolved article URL
+    url = db.Column(db.String(1024), primary_key=True)
+    canonical = db.Column(db.String(1024), nullable=False)
+    resolved_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class HtmlBlob(db.Model):
+    hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(8), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
 
 class CollectionDetail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_id = db.Column(db.Integer, db.ForeignKey('collection_item.id'), nullable=False)
     content_text = db.Column(db.Text)
-    content_html = db.Column(db.Text)
+    # legacy inline HTML; new rows reference a compressed HtmlBlob instead
+    content_html = db.deferred(db.Column(db.Text))
+    html_hash = db.Column(db.String(64), db.ForeignKey('html_blob.hash'), index=True)
     final_url = db.Column(db.String(1024))
+    simhash = db.Column(db.BigInteger)
+    # near-duplicate of this detail row (syndicated copy); NULL when canonical
+    canonical_id = db.Column(db.Integer, db.ForeignKey('collection_detail.id'), index=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     item = db.relationship('CollectionItem')
 
+    @property
+    def html(self):
+        if self.html_hash:
+            from .collector.blobstore import get_html
+            return get_html(self.html_hash)
+        return self.content_html
+
+class SimhashBand(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    band = db.Column(db.SmallInteger, nullable=False)
+    value = db.Column(db.Integer, nullable=False)
+    detail_id = db.Column(db.Integer, db.ForeignKey('collection_detail.id'), nullable=False, index=True)
+    __table_args__ = (db.Index('ix_simhash_band_band_value', 'band', 'value'),)
+
 class CrawlRule(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128))
@@ -61,8 +100,24 @@ class AIEngine(db.Model):
     api_key = db.Column(db.String(512))
     model_name = db.Column(db.String(256), nullable=False)
     enabled = db.Column(db.Boolean, default=True)
+    # prompt budget, see app/ai/packer.py; NULL falls back to AI_CONTEXT_TOKENS / AI_OUTPUT_RESERVE
+    context_tokens = db.Column(db.Integer)
+    output_reserve = db.Column(db.Integer)
+    # engine pool routing, see app/ai/pool.py: comma-separated capability
+    # tags and the most concurrent requests (NULL: AI_ENGINE_CONCURRENCY)
+    tags = db.Column(db.String(256))
+    max_concurrency = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
+class AIResponseCache(db.Model):
+    # persistent tier of app/ai/cache.py; key hashes engine, model, messages and params
+    key = db.Column(db.String(64), primary_key=True)
+    engine_id = db.Column(db.Integer, nullable=False, index=True)
+    model_name = db.Column(db.String(256), nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
 class Crawler(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
@@ -85,3 +140,25 @@ class CrawlerSource(db.Model):
     enabled = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     crawler = db.relationship('Crawler')
+
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    total = db.Column(db.Integer, nullable=False, default=0)
+    done = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    params = db.Column(db.Text)
+    result = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+class JobItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.Integer, db.ForeignKey('job.id'), nullable=False, index=True)
+    ref_id = db.Column(db.Integer)
+    status = db.Column(db.String(16), nullable=False, default='pending')
+    message = db.Column(db.Text)
+    result = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
@@ -0,0 +1,28 @@
+from sqlalchemy import inspect
+from .extensions import db
+from .models import Role, User, Setting
+
+def seed_defaults():
+    # idempotent: only fills tables that are still empty; returns what was added
+    insp = inspect(db.engine)
+    added = []
+    if insp.has_table('role') and not db.session.query(Role.id).first():
+        db.session.add_all([Role(name='admin'), Role(name='user')])
+        db.session.commit()
+        added.append('roles')
+    if insp.has_table('user') and not db.session.query(User.id).first():
+        admin_role = db.session.query(Role).filter_by(name='admin').first()
+        if admin_role:
+            u = User(username='admin', role=admin_role)
+            u.set_password('admin123')
+            db.session.add(u)
+            db.session.commit()
+            added.append('admin user')
+    if insp.has_table('setting') and not db.session.query(Setting.id).first():
+        db.session.add(Setting(app_name='政企智能舆情分析报告生成'))
+        db.session.commit()
+        added.append('setting')
+    if added:
+        from .cache import identity_cache
+        identity_cache.invalidate()
+    return added
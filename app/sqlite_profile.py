@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from sqlalchemy import event
+
+_JOURNAL = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNC = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_TEMP = {'DEFAULT', 'FILE', 'MEMORY'}
+
+def profile_from_config(cfg):
+    return {
+        'journal_mode': str(cfg.get('SQLITE_JOURNAL_MODE') or 'WAL').upper(),
+        'synchronous': str(cfg.get('SQLITE_SYNCHRONOUS') or 'NORMAL').upper(),
+        'cache_size': int(cfg.get('SQLITE_CACHE_SIZE') or -65536),
+        'mmap_size': int(cfg.get('SQLITE_MMAP_SIZE') or 0),
+        'temp_store': str(cfg.get('SQLITE_TEMP_STORE') or 'MEMORY').upper(),
+        'busy_timeout': int(cfg.get('SQLITE_BUSY_TIMEOUT') or 5000),
+    }
+
+# sqlite3 defaults, used as the benchmark baseline
+BASELINE = {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'cache_size': -2000,
+            'mmap_size': 0, 'temp_store': 'DEFAULT', 'busy_timeout': 5000}
+
+def apply_pragmas(conn, profile: dict):
+    # values are interpolated, so only whitelisted words and ints get through
+    cur = conn.cursor()
+    try:
+        cur.execute(f"PRAGMA busy_timeout={int(profile['busy_timeout'])}")
+        if profile['journal_mode'] in _JOURNAL:
+            cur.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+        if profile['synchronous'] in _SYNC:
+            cur.execute(f"PRAGMA synchronous={profile['synchronous']}")
+        cur.execute(f"PRAGMA cache_size={int(profile['cache_size'])}")
+        cur.execute(f"PRAGMA mmap_size={int(profile['mmap_size'])}")
+        if profile['temp_store'] in _TEMP:
+            cur.execute(f"PRAGMA temp_store={profile['temp_store']}")
+    finally:
+        cur.close()
+
+def init_app(app, db):
+    if db.engine.dialect.name != 'sqlite':
+        return
+    profile = profile_from_config(app.config)
+
+    @event.listens_for(db.engine, 'connect')
+    def _on_connect(dbapi_conn, record):
+        apply_pragmas(dbapi_conn, profile)
+
+    # connections opened before the listener existed (e.g. during init)
+    db.engine.dispose()
+
+def _bench_connect(path, profile):
+    conn = sqlite3.connect(path, timeout=profile['busy_timeout'] / 1000)
+    apply_pragmas(conn, profile)
+    return conn
+
+def _bench_reader(path, profile, stop, out):
+    conn = _bench_connect(path, profile)
+    n = locked = 0
+    while time.time() < stop:
+        try:
+            conn.execute('SELECT id, title, source FROM collection_item ORDER BY created_at DESC, id DESC LIMIT 20 OFFSET ?',
+                         (random.randint(0, 200),)).fetchall()
+            conn.execute('SELECT count(*) FROM collection_item').fetchone()
+            n += 1
+        except sqlite3.OperationalError:
+            locked += 1
+    conn.close()
+    out.put(('reads', n, locked))
+
+def _bench_writer(path, profile, stop, out, wid):
+    conn = _bench_connect(path, profile)
+    n = locked = 0
+    while time.time() < stop:
+        try:
+            with conn:
+                conn.executemany('INSERT INTO collection_item (title, url, keyword, deep_status) VALUES (?, ?, ?, 0)',
+                                 [(f'bench {wid}-{n}-{i}', f'bench://{wid}/{n}/{i}/{random.random()}', '__bench__') for i in range(20)])
+            n += 1
+        except sqlite3.OperationalError:
+            locked += 1
+    conn.close()
+    out.put(('writes', n, locked))
+
+def _bench_once(path: str, profile: dict, readers: int, writers: int, seconds: float):
+    # separate processes, like gunicorn workers: no shared GIL or pool
+    ctx = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    out = ctx.Queue()
+    stop = time.time() + 1.0 + seconds
+    procs = [ctx.Process(target=_bench_reader, args=(path, profile, stop, out)) for _ in range(readers)]
+    procs += [ctx.Process(target=_bench_writer, args=(path, profile, stop, out, i)) for i in range(writers)]
+    for p in procs:
+        p.start()
+    stats = {'reads': 0, 'writes': 0, 'locked': 0}
+    for _ in procs:
+        kind, n, locked = out.get(timeout=seconds + 60)
+        stats[kind] += n
+        stats['locked'] += locked
+    for p in procs:
+        p.join()
+    return {'reads_per_s': round(stats['reads'] / seconds, 1), 'write_tx_per_s': round(stats['writes'] / seconds, 1),
+            'locked_errors': stats['locked']}
+
+def benchmark(path: str, profile: dict, readers: int = 4, writers: int = 2, seconds: float = 5.0):
+    # Runs the same mixed read/write load against throwaway copies of the
+    # database, once with sqlite3 defaults and once with the given profile.
+    # The live file is only read.
+    out = {}
+    tmpdir = tempfile.mkdtemp(prefix='govinfo-bench-')
+    try:
+        src = sqlite3.connect(path)
+        for name, prof in (('baseline', BASELINE), ('tuned', profile)):
+            copy = os.path.join(tmpdir, f'{name}.db')
+            dst = sqlite3.connect(copy)
+            src.backup(dst)
+            dst.close()
+            out[name] = _bench_once(copy, prof, readers, writers, seconds)
+        src.close()
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return out
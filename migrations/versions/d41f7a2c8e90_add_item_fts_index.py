@@ -0,0 +1,67 @@
+"""add item full-text index
+
+Revision ID: d41f7a2c8e90
+Revises: b7e3f0a9c512
+Create Date: 2026-10-18 19:48:12.518823
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f7a2c8e90'
+down_revision = 'b7e3f0a9c512'
+branch_labels = None
+depends_on = None
+
+CHUNK = 500
+
+# frozen copy of the tokenizer in app/collector/search.py as of this revision,
+# so replaying the migration builds the same index whatever the app does later
+_HAN = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_RUN = re.compile(f'[{_HAN}]+|[^\\W_{_HAN}]+', re.UNICODE)
+_CJK = re.compile(f'[{_HAN}]')
+
+
+def _grams(run):
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)] + [run[-1]]
+
+
+def tokenize(value):
+    out = []
+    for run in _RUN.findall((value or '').lower()):
+        out.extend(_grams(run) if _CJK.match(run) else [run])
+    return ' '.join(out)
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    # text is stored pre-tokenized (CJK bigrams), see app/collector/search.py
+    op.execute("CREATE VIRTUAL TABLE IF NOT EXISTS item_fts USING fts5(title, source, keyword, body, tokenize='unicode61 remove_diacritics 2')")
+
+    last = 0
+    while True:
+        rows = bind.execute(sa.text('SELECT id, title, source, keyword FROM collection_item WHERE id > :last ORDER BY id LIMIT :n'),
+                            {'last': last, 'n': CHUNK}).fetchall()
+        if not rows:
+            break
+        last = rows[-1][0]
+        bodies = dict(bind.execute(sa.text(
+            'SELECT d.item_id, d.content_text FROM collection_detail d '
+            'JOIN (SELECT max(id) AS id FROM collection_detail WHERE item_id BETWEEN :lo AND :hi GROUP BY item_id) m ON m.id = d.id'),
+            {'lo': rows[0][0], 'hi': last}).fetchall())
+        params = [{'id': i, 'title': tokenize(t), 'source': tokenize(s), 'keyword': tokenize(k), 'body': tokenize(bodies.get(i))}
+                  for i, t, s, k in rows]
+        bind.execute(sa.text('INSERT INTO item_fts(rowid, title, source, keyword, body) VALUES (:id, :title, :source, :keyword, :body)'), params)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE IF EXISTS item_fts')
@@ -0,0 +1,12 @@
+import os
+from app.importtime import measure
+
+FORBIDDEN = ('bs4', 'requests', 'lxml')
+# generous enough for a cold CI runner; lower it locally to catch regressions
+BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS') or 1500)
+
+def test_create_app_import_budget():
+    rows, total = measure()
+    loaded = {name.split('.')[0] for _, _, name in rows}
+    assert not loaded & set(FORBIDDEN), f'imported at startup: {sorted(loaded & set(FORBIDDEN))}'
+    assert total / 1000 <= BUDGET_MS, f'startup imports took {total / 1000:.1f} ms, budget {BUDGET_MS} ms'
@@ -0,0 +1,39 @@
+from app.models import CrawlRule
+from app.collector.rule_index import RuleIndex
+
+def _index(*sites):
+    rows = [CrawlRule(id=i, name=f'r{i}', site=site, enabled=True) for i, site in enumerate(sites, 1)]
+    idx = RuleIndex()
+    idx._stamp.changed = lambda: False
+    idx._snap = idx._build(rows)
+    return idx
+
+def _sites(idx, url, source=None):
+    return [r.site for r in idx.match(source, url)]
+
+def test_redirect_links_do_not_match_subdomain_rules():
+    idx = _index('baijiahao.baidu.com', 'news.baidu.com')
+    assert _sites(idx, 'https://www.baidu.com/link?url=abc') == []
+    assert _sites(idx, 'https://baidu.com/link?url=abc') == []
+    assert _sites(idx, 'https://baijiahao.baidu.com/s?id=1') == ['baijiahao.baidu.com']
+
+def test_parent_domain_rules_apply_to_hosts_below():
+    idx = _index('example.com', 'news.example.com')
+    assert _sites(idx, 'https://news.example.com/a') == ['news.example.com', 'example.com']
+    assert _sites(idx, 'https://www.example.com/a') == ['example.com']
+    assert _sites(idx, 'https://example.com/a') == ['example.com']
+
+def test_www_is_an_alias_only_for_the_bare_host():
+    idx = _index('www.example.cn')
+    assert _sites(idx, 'https://www.example.cn/a') == ['www.example.cn']
+    assert _sites(idx, 'https://example.cn/a') == ['www.example.cn']
+    assert _sites(idx, 'https://news.example.cn/a') == []
+
+def test_sibling_fallback_stays_under_the_site():
+    idx = _index('b.news.example.com', 'other.example.com')
+    assert _sites(idx, 'https://a.news.example.com/x') == ['b.news.example.com']
+    assert _sites(idx, 'https://news.example.com/x') == []
+
+def test_source_name_matches_first():
+    idx = _index('news.example.com')
+    assert _sites(idx, 'https://other.org/x', source='r1') == ['news.example.com']